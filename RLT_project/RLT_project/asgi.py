@@ -2,6 +2,8 @@
 ASGI config for RLT_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, WebSocket connections (/ws/chat/<chat_id>/) go to the
+chat push channel.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RLT_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chat.consumers import websocket_application  # noqa: E402  (после настройки Django)
+from chat.realtime import check_channel_layer  # noqa: E402
+from rag.serving import configure_torch_threads  # noqa: E402
+
+# uvicorn --workers N: каждый воркер берёт свою долю ядер (N из WEB_CONCURRENCY)
+configure_torch_threads()
+# несколько воркеров с InMemoryChannelLayer — ошибка запуска
+check_channel_layer()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -75,6 +77,22 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB=sqlite — запуск без Postgres (локально, manage.py loadtest).
+# WAL: чтения не ждут записи; IMMEDIATE: запись сразу берёт блокировку и ждёт её
+# до timeout секунд, а не падает с "database is locked" при повышении блокировки
+if os.environ.get('DJANGO_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -112,6 +130,76 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# LLM: допуск запросов к модели (rag.scheduler)
+# Одновременных вызовов на бэкенд — на весь хост (все воркеры gunicorn и ask_worker
+# делят слоты-файлы в RAG_LLM_SLOT_DIR; '' — лимит только внутри процесса).
+# Длина очереди и дедлайн ожидания (сек.) — на процесс. Для Ollama держите
+# OLLAMA_NUM_PARALLEL равным лимиту.
+
+RAG_LLM_CONCURRENCY = {'ollama': 1}
+RAG_LLM_SLOT_DIR = os.path.join(tempfile.gettempdir(), 'rlt-llm-slots')
+RAG_LLM_MAX_QUEUE = 32
+RAG_LLM_QUEUE_TIMEOUT = {'answer': 30.0, 'normalize': 5.0}
+
+# Ollama HTTP API и переопределения профилей генерации (rag.llm.GENERATION_PROFILES),
+# например: {'answer': {'think': 'low', 'num_predict': 512}}
+
+RAG_OLLAMA_URL = 'http://localhost:11434'
+RAG_OLLAMA_MODEL = 'gpt-oss:20b'
+RAG_LLM_PROFILES = {}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rag': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Многопроцессный запуск (rag.serving, gunicorn.conf.py)
+# Потоков torch на воркер; None — ядра делятся поровну между WEB_CONCURRENCY воркерами
+RAG_TORCH_THREADS = None
+# Файл весов RoSBERTa для загрузки через mmap (manage.py export_embed_weights);
+# нужен для uvicorn --workers, где нет fork после preload
+RAG_EMBED_WEIGHTS_MMAP = None
+
+# Сообщения чатов: помесячные секции в Postgres (chat.partitions, manage.py message_partitions)
+CHAT_MESSAGE_RECENT_MONTHS = 3        # окно Message.objects.recent()/for_chat() по умолчанию
+CHAT_MESSAGE_PARTITIONS_AHEAD = 3     # секции создаются заранее на столько месяцев
+CHAT_MESSAGE_RETENTION_MONTHS = 12    # старше — выгрузка в архив и отсоединение секции
+CHAT_MESSAGE_ARCHIVE_DIR = BASE_DIR / 'message_archive'
+
+# WebSocket push-канал чатов (chat.consumers; нужен ASGI-сервер: uvicorn/daphne)
+# InMemoryChannelLayer — только один процесс (runserver, uvicorn без --workers);
+# несколько воркеров gunicorn/uvicorn (WEB_CONCURRENCY > 1), несколько узлов
+# или стриминг из ask_worker — RedisChannelLayer:
+# CHAT_CHANNEL_LAYER = 'chat.realtime.RedisChannelLayer'
+# CHAT_CHANNEL_LAYER_OPTIONS = {'url': 'redis://localhost:6379/0'}
+
+CHAT_CHANNEL_LAYER = 'chat.realtime.InMemoryChannelLayer'
+CHAT_CHANNEL_LAYER_OPTIONS = {}
+CHAT_WS_SEND_BUFFER = 256
+
+# Реранжирование кандидатов cross-encoder'ом (rag.rerank)
+# Кандидатов из Qdrant, порог релевантности, бюджет времени этапа (сек.)
+
+RAG_RERANK_ENABLED = True
+RAG_RERANK_CANDIDATES = 30
+RAG_RERANK_THRESHOLD = 0.3
+RAG_RERANK_BATCH_SIZE = 8
+RAG_RERANK_LATENCY_BUDGET = 0.8
+RAG_RERANK_CACHE_SIZE = 20000
+
+# Асинхронный режим /api/ask/ (rag.jobs, воркер: manage.py ask_worker)
+
+RAG_ASK_ASYNC = False
+RAG_JOB_MAX_ATTEMPTS = 3
+RAG_JOB_VISIBILITY_TIMEOUT = 300
+RAG_JOB_RETRY_BACKOFF = 10
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
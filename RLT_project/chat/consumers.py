@@ -0,0 +1,108 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import Chat
+from .realtime import chat_group, get_channel_layer
+
+CHAT_PATH = re.compile(r"^/ws/chat/(?P<chat_id>[0-9a-fA-F-]{36})/$")
+
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+CLOSE_TRY_AGAIN_LATER = 1013   # клиент не успевает читать: переподключиться и догрузить историю
+
+
+@sync_to_async
+def _can_listen(chat_id, user_id):
+    """Слушать чат могут его владелец и назначенный сотрудник поддержки"""
+    if not user_id:
+        return False
+    try:
+        return Chat.objects.filter(id=chat_id).filter(Q(user_id=user_id) | Q(assigned_to_id=user_id)).exists()
+    except ValidationError:
+        return False
+
+
+class ChatConnection:
+    """
+    Push-канал одного чата: новые сообщения, токены ответа бота, смена оператора.
+    Буфер отправки ограничен: при переполнении токены отбрасываются
+    (финальное сообщение всё равно придёт целиком), а на остальных событиях
+    соединение закрывается с кодом 1013.
+    """
+
+    def __init__(self, chat_id, send, buffer_size):
+        self.group = chat_group(chat_id)
+        self.send = send
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped_tokens = 0
+        self.closing = False
+        self.sender = None
+
+    def _push(self, event):
+        if self.closing:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if event.get("type") == "token":
+                self.dropped_tokens += 1
+                return
+            self.closing = True
+            self.sender.cancel()
+            asyncio.ensure_future(self._close(CLOSE_TRY_AGAIN_LATER))
+
+    async def _close(self, code):
+        try:
+            await self.send({"type": "websocket.close", "code": code})
+        except Exception:
+            pass
+
+    async def _sender(self):
+        while True:
+            event = await self.queue.get()
+            await self.send({"type": "websocket.send", "text": json.dumps(event, ensure_ascii=False)})
+
+    async def run(self, receive):
+        await self.send({"type": "websocket.accept"})
+        loop = asyncio.get_running_loop()
+        self.sender = asyncio.create_task(self._sender())
+        unsubscribe = await get_channel_layer().subscribe(
+            self.group, lambda event: loop.call_soon_threadsafe(self._push, event)
+        )
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                # канал только на отправку: входящие кадры клиента игнорируются
+        finally:
+            self.sender.cancel()
+            await unsubscribe()
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI-приложение для /ws/chat/<chat_id>/?user=<user_id>"""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    match = CHAT_PATH.match(scope["path"])
+    if not match:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    params = parse_qs(scope.get("query_string", b"").decode())
+    user_id = (params.get("user") or [None])[0]
+    if not await _can_listen(match["chat_id"], user_id):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+
+    buffer_size = getattr(settings, "CHAT_WS_SEND_BUFFER", 256)
+    await ChatConnection(match["chat_id"], send, buffer_size).run(receive)
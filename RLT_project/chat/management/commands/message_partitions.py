@@ -0,0 +1,72 @@
+import datetime
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...partitions import (
+    add_months, archive_path, detach_partition, detached_partitions, drop_partition, ensure_partitions,
+    expired_partitions, export_partition, is_partitioned, partition_month,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Помесячные секции сообщений: создать секции наперёд, "
+        "выгрузить секции старше срока хранения в gzip JSONL и отсоединить их"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=getattr(settings, "CHAT_MESSAGE_PARTITIONS_AHEAD", 3),
+                            help="Сколько месяцев вперёд держать готовые секции")
+        parser.add_argument("--archive", action="store_true", help="Архивировать секции старше срока хранения")
+        parser.add_argument("--retention-months", type=int,
+                            default=getattr(settings, "CHAT_MESSAGE_RETENTION_MONTHS", 12))
+        parser.add_argument("--out", default=str(getattr(settings, "CHAT_MESSAGE_ARCHIVE_DIR", "message_archive")),
+                            help="Каталог для архивов")
+        parser.add_argument("--drop", action="store_true",
+                            help="Удалить отсоединённую секцию после выгрузки (иначе остаётся отдельной таблицей)")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+
+    def handle(self, *args, ahead, archive, retention_months, out, drop, dry_run, **kwargs):
+        if not is_partitioned():
+            self.stdout.write("chat_message не секционирована (не Postgres или миграции не применены) — пропуск")
+            return
+
+        if dry_run:
+            self.stdout.write(f"Секции наперёд: {ahead} мес.")
+        else:
+            for name in ensure_partitions(ahead):
+                self.stdout.write(self.style.SUCCESS(f"✅ Создана секция {name}"))
+
+        if not archive:
+            return
+
+        expired = expired_partitions(retention_months)
+        # отсоединённые ранее, но не выгруженные (прерванный запуск) — дорабатываем
+        pending = [name for name in detached_partitions() if name not in expired]
+        for name in expired + pending:
+            if dry_run:
+                self.stdout.write(f"Будет архивирована секция {name}")
+                continue
+            if name in expired:
+                # сначала отсоединяем: выгрузка идёт из отдельной таблицы, без блокировки чатов
+                detach_partition(name)
+            path = archive_path(name, out)
+            if name in expired or not os.path.exists(path):
+                path, rows = export_partition(name, out)
+                self.stdout.write(self.style.SUCCESS(f"✅ {name}: {rows} сообщений → {path}"))
+            self._purge_jobs(name)
+            if drop:
+                drop_partition(name)
+                self.stdout.write(f"   {name}: таблица удалена")
+
+    def _purge_jobs(self, name):
+        """Задачи ответа по архивированным сообщениям: ключ на сообщение без ограничения в БД"""
+        if not apps.is_installed("rag"):
+            return
+        AskJob = apps.get_model("rag", "AskJob")
+        month = add_months(partition_month(name), 1)
+        upper = datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc)
+        AskJob.objects.filter(created_at__lt=upper, status__in=["done", "dead"]).delete()
@@ -0,0 +1,88 @@
+"""
+chat_message -> таблица, секционированная по месяцам created_at (только Postgres).
+
+Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+поэтому в БД он (id, created_at); для Django pk по-прежнему id.
+Внешние ключи AskJob на сообщения перед этим переведены в db_constraint=False.
+"""
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _add_indexes(cursor, prefix):
+    # имена с префиксом: старая таблица и её индексы ещё существуют, пока копируются данные
+    cursor.execute(f"CREATE INDEX {prefix}_created_at_idx ON chat_message (created_at)")
+    cursor.execute(f"CREATE INDEX {prefix}_chat_id_idx ON chat_message (chat_id)")
+    cursor.execute(f"CREATE INDEX {prefix}_author_id_idx ON chat_message (author_id)")
+    cursor.execute(
+        f"ALTER TABLE chat_message ADD CONSTRAINT {prefix}_chat_id_fk "
+        "FOREIGN KEY (chat_id) REFERENCES chat_chat (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    cursor.execute(
+        f"ALTER TABLE chat_message ADD CONSTRAINT {prefix}_author_id_fk "
+        "FOREIGN KEY (author_id) REFERENCES chat_user (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+def partition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE chat_message RENAME TO chat_message_legacy")
+        cursor.execute(
+            "CREATE TABLE chat_message (LIKE chat_message_legacy INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute("ALTER TABLE chat_message ADD CONSTRAINT chat_message_part_pkey PRIMARY KEY (id, created_at)")
+        _add_indexes(cursor, "chat_message_part")
+        cursor.execute("CREATE TABLE chat_message_default PARTITION OF chat_message DEFAULT")
+
+        # секции от самого старого сообщения до MONTHS_AHEAD месяцев вперёд
+        cursor.execute("SELECT min(created_at) FROM chat_message_legacy")
+        first = cursor.fetchone()[0] or timezone.now()
+        first = first.astimezone(datetime.timezone.utc)
+        month = datetime.date(first.year, first.month, 1)
+        now = timezone.now()
+        last = _add_months(datetime.date(now.year, now.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE chat_message_p{month:%Y%m} PARTITION OF chat_message "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{_add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+            )
+            month = _add_months(month, 1)
+
+        cursor.execute("INSERT INTO chat_message SELECT * FROM chat_message_legacy")
+        cursor.execute("DROP TABLE chat_message_legacy")
+
+
+def unpartition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE chat_message_plain (LIKE chat_message INCLUDING DEFAULTS)")
+        cursor.execute("INSERT INTO chat_message_plain SELECT * FROM chat_message")
+        cursor.execute("DROP TABLE chat_message")   # вместе с подключёнными секциями
+        cursor.execute("ALTER TABLE chat_message_plain RENAME TO chat_message")
+        cursor.execute("ALTER TABLE chat_message ADD CONSTRAINT chat_message_pkey PRIMARY KEY (id)")
+        _add_indexes(cursor, "chat_message")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        ('rag', '0002_alter_askjob_answer_alter_askjob_question'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_partition_messages'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'created_at'], name='chat_message_chat_created_idx'),
+        ),
+    ]
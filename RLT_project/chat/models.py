@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.db import models
 import uuid
+
+from .partitions import recent_since
 # Create your models here.
 
 class User(models.Model):
@@ -18,6 +21,21 @@ class Chat(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
                                     related_name='assigned_chats')
+class MessageQuerySet(models.QuerySet):
+    def recent(self, months=None):
+        """
+        Сообщения за последние months месяцев (по умолчанию CHAT_MESSAGE_RECENT_MONTHS):
+        условие по created_at отсекает старые помесячные секции в Postgres.
+        """
+        if months is None:
+            months = getattr(settings, 'CHAT_MESSAGE_RECENT_MONTHS', 3)
+        return self.filter(created_at__gte=recent_since(months))
+
+    def for_chat(self, chat, months=None):
+        """История чата за последние месяцы, по времени"""
+        return self.recent(months).filter(chat=chat).order_by('created_at')
+
+
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
@@ -26,6 +44,11 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     is_read = models.BooleanField(default=False)
 
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['chat', 'created_at'], name='chat_message_chat_created_idx')]
+
     def __str__(self):
         return f"{self.author.id}: {self.text[:50]}..."
 
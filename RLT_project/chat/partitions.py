@@ -0,0 +1,180 @@
+"""
+Помесячные секции таблицы сообщений (Postgres, PARTITION BY RANGE (created_at)).
+
+chat_message — секционированная таблица: секция chat_message_pYYYYMM на каждый
+месяц (границы в UTC) и chat_message_default для всего, что не попало в секции.
+Секции заводятся заранее (ensure_partitions), старые отсоединяются и выгружаются
+в gzip JSONL (export_partition). На других СУБД таблица обычная, функции ничего не делают.
+"""
+import datetime
+import gzip
+import json
+import os
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARENT = "chat_message"
+DEFAULT_PARTITION = "chat_message_default"
+PARTITION_RE = re.compile(r"^chat_message_p(\d{4})(\d{2})$")
+COLUMNS = ("id", "chat_id", "author_id", "text", "is_read", "created_at")
+FETCH_SIZE = 2000
+
+
+def month_floor(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def recent_since(months, now=None):
+    """Начало окна из months последних месяцев, включая текущий"""
+    start = add_months(month_floor(now or timezone.now()), -(max(1, months) - 1))
+    return datetime.datetime(start.year, start.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def partition_month(name):
+    match = PARTITION_RE.match(name)
+    return datetime.date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [PARENT],
+        )
+        return cursor.fetchone() is not None
+
+
+def attached_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+            """,
+            [PARENT],
+        )
+        return sorted(name for (name,) in cursor.fetchall() if PARTITION_RE.match(name))
+
+
+def detached_partitions():
+    """Отсоединённые, но ещё не удалённые секции (например, прерванная архивация)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_class c
+            WHERE c.relkind = 'r' AND c.relname LIKE %s
+              AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+            """,
+            [PARENT + "_p%"],
+        )
+        return sorted(name for (name,) in cursor.fetchall() if PARTITION_RE.match(name))
+
+
+def _bounds(month):
+    return f"{month:%Y-%m-%d} 00:00:00+00", f"{add_months(month, 1):%Y-%m-%d} 00:00:00+00"
+
+
+def create_partition(month):
+    """
+    Секция за месяц. Строки этого месяца, уже попавшие в default-секцию,
+    переносятся в новую: иначе ATTACH не пройдёт проверку default.
+    """
+    name = partition_name(month)
+    lower, upper = _bounds(month)
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(PARENT)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s "
+            f"RETURNING *) INSERT INTO {qn(name)} SELECT * FROM moved",
+            [lower, upper],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(PARENT)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+    return name
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Секции на текущий месяц и months_ahead следующих; возвращает созданные"""
+    if not is_partitioned():
+        return []
+    existing = set(attached_partitions())
+    current = month_floor(now or timezone.now())
+    created = []
+    for n in range(months_ahead + 1):
+        month = add_months(current, n)
+        if partition_name(month) not in existing:
+            created.append(create_partition(month))
+    return created
+
+
+def expired_partitions(retention_months, now=None):
+    """Секции, целиком старше окна хранения"""
+    if not is_partitioned():
+        return []
+    oldest_kept = add_months(month_floor(now or timezone.now()), -retention_months)
+    return [name for name in attached_partitions() if partition_month(name) < oldest_kept]
+
+
+def detach_partition(name):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(PARENT)} DETACH PARTITION {qn(name)}")
+
+
+def archive_path(name, directory):
+    return os.path.join(directory, f"{name}.jsonl.gz")
+
+
+def export_partition(name, directory):
+    """
+    Выгрузка отсоединённой секции в <directory>/<name>.jsonl.gz построчно
+    (серверный курсор, без загрузки таблицы в память). Возвращает (путь, число строк).
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(name, directory)
+    tmp = path + ".tmp"
+    rows = 0
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.chunked_cursor() as cursor, \
+            gzip.open(tmp, "wt", encoding="utf-8") as out:
+        cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM {qn(name)} ORDER BY created_at")
+        while True:
+            batch = cursor.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            for id_, chat_id, author_id, text, is_read, created_at in batch:
+                out.write(json.dumps({
+                    "id": str(id_),
+                    "chat": str(chat_id),
+                    "author": str(author_id),
+                    "text": text,
+                    "is_read": is_read,
+                    "created_at": created_at.isoformat(),
+                }, ensure_ascii=False) + "\n")
+            rows += len(batch)
+    os.replace(tmp, path)
+    return path, rows
+
+
+def drop_partition(name):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {qn(name)}")
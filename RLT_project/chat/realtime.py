@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def chat_group(chat_id):
+    return f"chat.{chat_id}"
+
+
+class InMemoryChannelLayer:
+    """
+    Слой каналов одного процесса: подписчики — callback'и WebSocket-соединений.
+    publish потокобезопасен (вызывается из синхронных view и сигналов).
+    Только runserver или один воркер: события из соседних процессов
+    (другие воркеры gunicorn/uvicorn, ask_worker) до подписчиков не дойдут.
+    """
+
+    single_process = True
+
+    def __init__(self, **options):
+        self._groups = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, group, event):
+        with self._lock:
+            subscribers = list(self._groups.get(group, ()))
+        for deliver in subscribers:
+            deliver(event)
+
+    async def subscribe(self, group, deliver):
+        """deliver(event) должен быть потокобезопасным; возвращает корутину отписки"""
+        with self._lock:
+            self._groups[group].add(deliver)
+
+        async def unsubscribe():
+            with self._lock:
+                self._groups[group].discard(deliver)
+                if not self._groups[group]:
+                    del self._groups[group]
+        return unsubscribe
+
+
+class RedisChannelLayer:
+    """Слой каналов для нескольких узлов: Redis pub/sub (веб-процессы и ask_worker)"""
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="rlt:", **options):
+        import redis
+        import redis.asyncio
+
+        self.prefix = prefix
+        self._sync = redis.Redis.from_url(url)
+        self._async = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, group, event):
+        self._sync.publish(self.prefix + group, json.dumps(event, ensure_ascii=False))
+
+    async def subscribe(self, group, deliver):
+        pubsub = self._async.pubsub()
+        await pubsub.subscribe(self.prefix + group)
+
+        async def pump():
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    deliver(json.loads(message["data"]))
+
+        task = asyncio.create_task(pump())
+
+        async def unsubscribe():
+            task.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+        return unsubscribe
+
+
+_LAYER = None
+_LAYER_LOCK = threading.Lock()
+
+
+def web_workers():
+    """Число веб-процессов: WEB_CONCURRENCY (gunicorn.conf.py выставляет его сам)"""
+    return int(os.environ.get("WEB_CONCURRENCY", 1))
+
+
+def get_channel_layer():
+    global _LAYER
+    with _LAYER_LOCK:
+        if _LAYER is None:
+            backend = getattr(settings, "CHAT_CHANNEL_LAYER", "chat.realtime.InMemoryChannelLayer")
+            options = getattr(settings, "CHAT_CHANNEL_LAYER_OPTIONS", {})
+            _LAYER = import_string(backend)(**options)
+            if getattr(_LAYER, "single_process", False) and web_workers() > 1:
+                logger.warning(
+                    "%s при %s веб-процессах: события чатов не дойдут до WebSocket других воркеров — "
+                    "нужен CHAT_CHANNEL_LAYER = 'chat.realtime.RedisChannelLayer'",
+                    backend, web_workers(),
+                )
+    return _LAYER
+
+
+def check_channel_layer():
+    """
+    Вызывается при старте ASGI-приложения (WebSocket): слой одного процесса
+    при нескольких воркерах — отказ запуска, а не молча потерянные события.
+    """
+    layer = get_channel_layer()
+    if getattr(layer, "single_process", False) and web_workers() > 1:
+        raise ImproperlyConfigured(
+            f"{type(layer).__name__} работает только в одном процессе, а WEB_CONCURRENCY={web_workers()}: "
+            "укажите CHAT_CHANNEL_LAYER = 'chat.realtime.RedisChannelLayer' или запустите один воркер"
+        )
+    return layer
+
+
+def publish_chat_event(chat_id, event):
+    """Отправка события всем подписчикам чата; сбой слоя не ломает запрос"""
+    try:
+        get_channel_layer().publish(chat_group(chat_id), event)
+    except Exception:
+        logger.exception("chat %s: событие %s не отправлено", chat_id, event.get("type"))
+
+
+def message_event(message):
+    return {
+        "type": "message",
+        "id": str(message.id),
+        "chat": str(message.chat_id),
+        "author": str(message.author_id),
+        "role": message.author.role,
+        "text": message.text,
+        "created_at": message.created_at.isoformat(),
+    }
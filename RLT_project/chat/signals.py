@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import Chat, Message
+from .realtime import message_event, publish_chat_event
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance, created, **kwargs):
+    if created:
+        event = message_event(instance)
+        transaction.on_commit(lambda: publish_chat_event(instance.chat_id, event))
+
+
+@receiver(post_init, sender=Chat)
+def remember_assignment(sender, instance, **kwargs):
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+
+
+@receiver(post_save, sender=Chat)
+def push_assignment(sender, instance, created, **kwargs):
+    if instance.assigned_to_id == instance._loaded_assigned_to_id:
+        return
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+    event = {
+        "type": "assignment",
+        "chat": str(instance.id),
+        "assigned_to": str(instance.assigned_to_id) if instance.assigned_to_id else None,
+    }
+    transaction.on_commit(lambda: publish_chat_event(instance.id, event))
@@ -1,3 +1,26 @@
-from django.test import TestCase
+import os
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from . import realtime
+
+
+@override_settings(CHAT_CHANNEL_LAYER="chat.realtime.InMemoryChannelLayer", CHAT_CHANNEL_LAYER_OPTIONS={})
+class ChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        realtime._LAYER = None
+        self.addCleanup(setattr, realtime, "_LAYER", None)
+
+    def test_in_memory_layer_single_worker(self):
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "1"}):
+            layer = realtime.check_channel_layer()
+        self.assertIsInstance(layer, realtime.InMemoryChannelLayer)
+
+    def test_in_memory_layer_refused_with_several_workers(self):
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "4"}):
+            with self.assertLogs("chat.realtime", "WARNING"):
+                realtime.get_channel_layer()
+            with self.assertRaises(ImproperlyConfigured):
+                realtime.check_channel_layer()
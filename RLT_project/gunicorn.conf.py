@@ -0,0 +1,39 @@
+# Многопроцессный запуск с общими весами моделей:
+#   gunicorn -c gunicorn.conf.py RLT_project.wsgi
+#   (WebSocket чатов: -k uvicorn.workers.UvicornWorker RLT_project.asgi —
+#    только с CHAT_CHANNEL_LAYER = 'chat.realtime.RedisChannelLayer': воркеров несколько,
+#    InMemoryChannelLayer не доставит события между ними, и ASGI-приложение не стартует)
+# Проверка после старта: python manage.py serving_check --pid <pid мастера>
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count() // 2)))
+# число воркеров видно приложению (chat.realtime, rag.serving) уже при preload в мастере
+os.environ["WEB_CONCURRENCY"] = str(workers)
+timeout = 300   # ответ LLM может идти минуты
+
+# приложение и модели загружаются один раз в мастере, воркеры делят веса после fork
+preload_app = True
+
+
+def when_ready(server):
+    from rag.serving import preload_models
+
+    preload_models()
+    server.log.info("Модели загружены в мастере, воркеров: %s", server.cfg.workers)
+
+
+def post_fork(server, worker):
+    from rag.serving import configure_torch_threads
+
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)   # -w в командной строке
+
+    threads = configure_torch_threads(server.cfg.workers)
+    server.log.info("worker %s: torch threads=%s", worker.pid, threads)
+
+
+def post_worker_init(worker):
+    from rag.serving import log_worker_report
+
+    log_worker_report()
@@ -0,0 +1,152 @@
+import re
+from functools import lru_cache
+
+from .textnorm import NORMALIZER
+
+# === 1. Стоп-слова ===
+STOPWORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где
+да даже для до его ее ей ему если есть еще же за здесь и из или им их к как какая
+какие какой ко когда кто ли либо мне может мы на над надо наш не него нее нет ни
+них но ну о об однако он она они оно от очень по под при с со так также такой там
+те тем то того тоже той только том ты у уже хотя чего чей чем что чтобы чье чья эта
+эти это этого этой этом я
+""".split())
+
+# Приставочные формы сворачиваются только у явно перечисленных семейств
+# ("зарегистр", "перерегистр" -> "регистр"). Общая свёртка по словарю корпуса
+# склеивала разные слова: договор/говор, доставка/ставка, заключить/ключ.
+PREFIXES = ("пере", "за")
+PREFIX_FAMILIES = ("регистр", "аккредит", "оформ", "оформлен", "заключ", "подписа")
+PREFIX_FOLDS = {prefix + family: family for prefix in PREFIXES for family in PREFIX_FAMILIES}
+
+# Словообразовательные суффиксы: "регистрац", "регистрирова" -> "регистр"
+DERIVATIONAL_SUFFIXES = ("ирова", "изова", "ова", "ац", "яц")
+MIN_STEM = 4
+
+_TOKEN_RE = re.compile(r"\d+-фз|\w+")
+
+
+# === 2. Стеммер Портера (Snowball) для русского языка ===
+_VOWELS = "аеиоуыэюя"
+_PERFECTIVE_GERUND = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+_REFLEXIVE = re.compile(r"(с[яь])$")
+_ADJECTIVE = re.compile(r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$")
+_PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+_VERB = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+    r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+_NOUN = re.compile(r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+_DERIVATIONAL = re.compile(r"(ость|ост)$")
+
+
+def _region(word, start):
+    """Начало региона после первой пары «гласная + согласная» (R1/R2 Snowball)"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem_ru(word: str) -> str:
+    """Основа русского слова по алгоритму Snowball"""
+    rv_start = next((i + 1 for i, ch in enumerate(word) if ch in _VOWELS), len(word))
+    pre, rv = word[:rv_start], word[rv_start:]
+    if not rv:
+        return word
+    r2 = max(_region(word, _region(word, 0)) - rv_start, 0)
+
+    # Шаг 1
+    temp = _PERFECTIVE_GERUND.sub("", rv, 1)
+    if temp == rv:
+        rv = _REFLEXIVE.sub("", rv, 1)
+        temp = _ADJECTIVE.sub("", rv, 1)
+        if temp != rv:
+            rv = _PARTICIPLE.sub("", temp, 1)
+        else:
+            temp = _VERB.sub("", rv, 1)
+            rv = _NOUN.sub("", rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3
+    m = _DERIVATIONAL.search(rv)
+    if m and m.start() >= r2:
+        rv = rv[:m.start()]
+
+    # Шаг 4
+    if rv.endswith("ь"):
+        rv = rv[:-1]
+    else:
+        rv = _SUPERLATIVE.sub("", rv, 1)
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+
+    return pre + rv
+
+
+# === 3. Анализаторы ===
+class SimpleAnalyzer:
+    """Прежнее поведение: нижний регистр, без пунктуации, split по пробелам"""
+
+    def analyze(self, text):
+        text = text.lower()
+        text = re.sub(r"[^\w\s]", "", text)
+        return text.split()
+
+    def analyze_many(self, texts, normalized=False):
+        # общей нормализации здесь нет — флаг принимается ради единого интерфейса
+        return [self.analyze(t) for t in texts]
+
+
+class RussianAnalyzer:
+    """
+    Анализатор для BM25: общая нормализация текста (ё/е, тире, 44-ФЗ — rag.textnorm),
+    стоп-слова, стемминг Snowball + свёртка словообразовательных суффиксов
+    и приставок (только семейства из PREFIX_FOLDS).
+    Результат token -> term кэшируется в ограниченном LRU.
+    """
+
+    def __init__(self, stopwords=STOPWORDS, folds=PREFIX_FOLDS, cache_size=100_000, normalizer=NORMALIZER):
+        self.stopwords = stopwords
+        self.folds = folds
+        self.normalizer = normalizer
+        self._term = lru_cache(maxsize=cache_size)(self._term_uncached)
+
+    def tokenize(self, text, normalized=False):
+        """normalized=True — текст уже в канонической форме (чанки из хранилища)"""
+        if not normalized:
+            text = self.normalizer.normalize(text)
+        return [t for t in _TOKEN_RE.findall(text.lower()) if t not in self.stopwords]
+
+    def _stem(self, token):
+        if token.isdigit() or token.endswith("-фз") or not token.isalpha():
+            return token
+        stem = stem_ru(token)
+        for suffix in DERIVATIONAL_SUFFIXES:
+            if stem.endswith(suffix) and len(stem) - len(suffix) >= MIN_STEM:
+                return stem[:-len(suffix)]
+        return stem
+
+    def _term_uncached(self, token):
+        stem = self._stem(token)
+        return self.folds.get(stem, stem)
+
+    def analyze(self, text):
+        """Термы запроса (горячий путь: почти всё берётся из кэша)"""
+        term = self._term
+        return [term(t) for t in self.tokenize(text)]
+
+    def analyze_many(self, texts, normalized=False):
+        """Пакетный режим для индексации: термы всех документов через тот же кэш"""
+        term = self._term
+        return [[term(t) for t in self.tokenize(text, normalized)] for text in texts]
+
+    def cache_info(self):
+        return self._term.cache_info()
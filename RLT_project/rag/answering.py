@@ -0,0 +1,36 @@
+from chat.models import User
+from chat.serializers import MessageSerializer
+
+THINKING_MARKER = "...done thinking."
+
+
+def parse_answer(answer: str):
+    """Убирает рассуждения модели и отделяет строку "Источник:" от текста ответа"""
+    # обрезаем всё до "...done thinking" включительно (вывод ollama CLI;
+    # HTTP API отдаёт рассуждения отдельным полем)
+    if THINKING_MARKER in answer:
+        answer = answer.split(THINKING_MARKER, 1)[1].strip()
+
+    sources = []
+    if "Источник:" in answer:
+        parts = answer.split("Источник:")
+        answer_text = parts[0].strip()
+        sources = [parts[1].strip()]
+    else:
+        answer_text = answer
+    return answer_text, sources
+
+
+def get_bot_user():
+    bot, _ = User.objects.get_or_create(role="llm_bot", defaults={"is_active": True})
+    return bot
+
+
+def bot_message_serializer(chat, answer_text):
+    """Несохранённый сериализатор сообщения бота (вызывающий проверяет is_valid)"""
+    return MessageSerializer(data={
+        "chat": str(chat.id),
+        "author": str(get_bot_user().id),
+        "text": answer_text,
+        "is_read": True,
+    })
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+from array import array
+from itertools import islice
+from pathlib import Path
+
+from .textnorm import DOCUMENT_NORMALIZER, NORMALIZER_VERSION
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+CHUNKS_PATH = DATA_DIR / "chunks.jsonl"
+
+SNIPPET_LEN = 500
+NORMALIZE_BATCH = 1024
+
+
+class ChunkStore:
+    """
+    Компактное хранилище чанков.
+    Заголовки и ссылки лежат в интернированных таблицах (каждая строка — один раз),
+    тексты — в одном непрерывном UTF-8 буфере с массивом смещений.
+    Строки Python создаются только при обращении к конкретному чанку.
+    Тексты хранятся в канонической форме rag.textnorm — той же, что у запросов.
+    build_id — хэш содержимого: номер чанка в Qdrant валиден только для той же сборки.
+    """
+
+    def __init__(self, titles, urls, title_ids, url_ids, offsets, buffer, build_id=None):
+        self.titles = titles
+        self.urls = urls
+        self.title_ids = title_ids
+        self.url_ids = url_ids
+        self.offsets = offsets
+        self.buffer = buffer
+        self.build_id = build_id or _content_hash(titles, urls, title_ids, url_ids, offsets, buffer)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # === Построение ===
+    @classmethod
+    def from_records(cls, records, normalizer=DOCUMENT_NORMALIZER):
+        """Собирает хранилище из итератора словарей {title, url, text}, нормализуя тексты пачками"""
+        titles, urls = [], []
+        title_index, url_index = {}, {}
+        title_ids, url_ids = array("I"), array("I")
+        offsets = array("Q", [0])
+        buffer = bytearray()
+
+        records = iter(records)
+        while batch := list(islice(records, NORMALIZE_BATCH)):
+            texts = normalizer.normalize_many(rec["text"] for rec in batch)
+            for rec, text in zip(batch, texts):
+                title = rec.get("title", "")
+                url = rec.get("url", "")
+                if title not in title_index:
+                    title_index[title] = len(titles)
+                    titles.append(sys.intern(title))
+                if url not in url_index:
+                    url_index[url] = len(urls)
+                    urls.append(sys.intern(url))
+                title_ids.append(title_index[title])
+                url_ids.append(url_index[url])
+                buffer += text.encode("utf-8")
+                offsets.append(len(buffer))
+
+        return cls(titles, urls, title_ids, url_ids, offsets, bytes(buffer))
+
+    @classmethod
+    def from_jsonl(cls, path=CHUNKS_PATH):
+        """Читает chunks.jsonl построчно, не держа в памяти список словарей"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_records(json.loads(line) for line in f if line.strip())
+
+    # === Сохранение / mmap ===
+    def save(self, path=CHUNKS_PATH):
+        """
+        Пишет рядом с jsonl: .bin (тексты), .idx (смещения и id), .meta.json (таблицы).
+        Каждый файл пишется во временный и подменяется через os.replace, meta — последним:
+        воркеры, у которых старый .bin отображён в память, продолжают читать старый inode.
+        """
+        bin_path, idx_path, meta_path = _store_paths(path)
+
+        def write_index(f):
+            self.offsets.tofile(f)
+            self.title_ids.tofile(f)
+            self.url_ids.tofile(f)
+
+        _write_replace(bin_path, lambda f: f.write(self.buffer))
+        _write_replace(idx_path, write_index)
+        meta = {
+            "count": len(self),
+            "size": self.offsets[-1],
+            "normalizer": NORMALIZER_VERSION,
+            "build": self.build_id,
+            "titles": self.titles,
+            "urls": self.urls,
+        }
+        _write_replace(meta_path, lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+        return bin_path
+
+    @classmethod
+    def open(cls, path=CHUNKS_PATH):
+        """
+        Открывает сохранённое хранилище. Текстовый буфер отображается в память (mmap),
+        поэтому воркеры на одном хосте делят одни и те же страницы page cache.
+        """
+        bin_path, idx_path, meta_path = _store_paths(path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        count = meta["count"]
+
+        offsets, title_ids, url_ids = array("Q"), array("I"), array("I")
+        with open(idx_path, "rb") as f:
+            offsets.fromfile(f, count + 1)
+            title_ids.fromfile(f, count)
+            url_ids.fromfile(f, count)
+        # файлы от разных сборок (сборка шла, пока мы открывали) — не смешиваем
+        if offsets[-1] != meta.get("size", offsets[-1]) or offsets[-1] != bin_path.stat().st_size:
+            raise ValueError(f"{bin_path}: файлы хранилища от разных сборок")
+
+        if offsets[-1]:
+            with open(bin_path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = b""
+
+        titles = [sys.intern(t) for t in meta["titles"]]
+        urls = [sys.intern(u) for u in meta["urls"]]
+        return cls(titles, urls, title_ids, url_ids, offsets, buffer, meta.get("build"))
+
+    # === Доступ ===
+    def title(self, i):
+        return self.titles[self.title_ids[i]]
+
+    def url(self, i):
+        return self.urls[self.url_ids[i]]
+
+    def text(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def snippet(self, i, limit=SNIPPET_LEN):
+        """Первые limit символов текста (+ "..."), декодируя только нужный префикс"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        if end - start <= limit:
+            return self.text(i)
+        # UTF-8: не больше 4 байт на символ
+        stop = min(end, start + 4 * (limit + 1))
+        s = self.buffer[start:stop].decode("utf-8", errors="ignore")
+        if len(s) > limit or stop < end:
+            return s[:limit] + "..."
+        return s
+
+    def get(self, i):
+        return {"title": self.title(i), "url": self.url(i), "text": self.text(i)}
+
+    def iter_texts(self):
+        for i in range(len(self)):
+            yield self.text(i)
+
+
+def _content_hash(titles, urls, title_ids, url_ids, offsets, buffer):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(json.dumps([titles, urls], ensure_ascii=False).encode("utf-8"))
+    for part in (title_ids, url_ids, offsets):
+        h.update(part.tobytes())
+    h.update(buffer)
+    return h.hexdigest()
+
+
+def _store_paths(path):
+    path = Path(path)
+    stem = path.with_suffix("")
+    return (
+        stem.with_suffix(".bin"),
+        stem.with_suffix(".idx"),
+        stem.with_suffix(".meta.json"),
+    )
+
+
+def _write_replace(path, write):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def build_store(path=CHUNKS_PATH):
+    """
+    Пересобирает компактное хранилище из chunks.jsonl и открывает его через mmap.
+    Вызывается из make_chunks; процессы сервиса файлы хранилища не пишут.
+    """
+    ChunkStore.from_jsonl(path).save(path)
+    return ChunkStore.open(path)
+
+
+def _store_normalizer(meta_path):
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("normalizer")
+
+
+def load_store(path=CHUNKS_PATH):
+    """
+    Открывает сохранённое хранилище через mmap, если оно свежее jsonl и собрано
+    текущей версией нормализации. Иначе — буфер в памяти процесса из chunks.jsonl:
+    пересборка общих файлов из воркера сломала бы соседей, у которых они отображены.
+    """
+    path = Path(path)
+    bin_path, idx_path, meta_path = _store_paths(path)
+    try:
+        fresh = all(
+            p.exists() and p.stat().st_mtime >= path.stat().st_mtime
+            for p in (bin_path, idx_path, meta_path)
+        ) and _store_normalizer(meta_path) == NORMALIZER_VERSION
+        if fresh:
+            return ChunkStore.open(path)
+        logger.warning(
+            "%s: хранилище чанков устарело — читаю jsonl в память; пересоберите: manage.py make_chunks --store-only",
+            path,
+        )
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning("%s: хранилище чанков не открылось (%s) — читаю jsonl в память", path, e)
+    return ChunkStore.from_jsonl(path)
+
+
+_STORE = None
+
+
+def get_store():
+    """Общее хранилище процесса (ленивая загрузка)"""
+    global _STORE
+    if _STORE is None:
+        _STORE = load_store()
+    return _STORE
+
+
+def reload_store():
+    """Сбрасывает хранилище процесса и открывает его заново (после make_chunks)"""
+    global _STORE
+    _STORE = None
+    return get_store()
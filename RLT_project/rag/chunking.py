@@ -6,10 +6,8 @@ DATA_DIR = Path(__file__).resolve().parent / "data"
 IN_FILE = DATA_DIR / "parsed_data.json"
 OUT_FILE = DATA_DIR / "chunks.jsonl"
 
-def build_all_chunks(chunk_size=1000, chunk_overlap=200):
-    with open(IN_FILE, "r", encoding="utf-8") as f:
-        articles = json.load(f)
-
+def split_articles(articles, chunk_size=1000, chunk_overlap=200):
+    """Режет статьи на чанки {title, url, text}"""
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
@@ -31,6 +29,14 @@ def build_all_chunks(chunk_size=1000, chunk_overlap=200):
         for chunk in splitter.split_text(text):
             all_chunks.append({**meta, "text": chunk})
 
+    return all_chunks
+
+def build_all_chunks(chunk_size=1000, chunk_overlap=200):
+    with open(IN_FILE, "r", encoding="utf-8") as f:
+        articles = json.load(f)
+
+    all_chunks = split_articles(articles, chunk_size, chunk_overlap)
+
     with open(OUT_FILE, "w", encoding="utf-8") as f:
         for ch in all_chunks:
             f.write(json.dumps(ch, ensure_ascii=False) + "\n")
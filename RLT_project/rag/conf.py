@@ -0,0 +1,9 @@
+def get_setting(name, default):
+    """Значение из django.conf.settings, если Django настроен (иначе — дефолт)"""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
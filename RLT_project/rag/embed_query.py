@@ -1,23 +1,57 @@
+import os
 import torch
-from transformers import AutoTokenizer, AutoModel
+from transformers import AutoTokenizer, AutoModel, AutoConfig
 import numpy as np
 from .normalize_query import normalise_query, TERMINS
+from .conf import get_setting
+from .textnorm import NORMALIZER
+import threading
 import warnings
 
 # Подавляем предупреждения о неинициализированных весах
 warnings.filterwarnings("ignore", message="Some weights of.*were not initialized")
 
-# Загрузка модели и токенизатора
+# Модель и токенизатор загружаются при первом эмбеддинге (или явно через load_model)
 model_path = "/home/user/ru-en-RoSBERTa/"
-tokenizer = AutoTokenizer.from_pretrained(model_path)
-model = AutoModel.from_pretrained(model_path)
-model.eval()
+tokenizer = None
+model = None
+_load_lock = threading.Lock()
+
+def _load_mmap(weights_path):
+    # веса остаются в файле: страницы общие для всех процессов через page cache
+    m = AutoModel.from_config(AutoConfig.from_pretrained(model_path))
+    state = torch.load(weights_path, mmap=True, weights_only=True)
+    m.load_state_dict(state, assign=True)
+    return m
+
+def load_model():
+    global tokenizer, model
+    with _load_lock:
+        if model is None:
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            weights_path = get_setting("RAG_EMBED_WEIGHTS_MMAP", None)
+            if weights_path and os.path.exists(weights_path):
+                model = _load_mmap(weights_path)
+            else:
+                model = AutoModel.from_pretrained(model_path)
+            model.eval()
+    return tokenizer, model
+
+def export_mmap_weights(weights_path):
+    """Сохраняет веса в формате torch для загрузки с mmap=True (см. load_model)"""
+    m = AutoModel.from_pretrained(model_path)
+    torch.save({k: v.contiguous() for k, v in m.state_dict().items()}, weights_path)
+    return weights_path
 
 # Функция для получения эмбеддинга из текста
 def get_embedding(text, remove_prefix=True):
+    tokenizer, model = load_model()
+
     # Извлекаем текст после "search_query: " если нужно
     if remove_prefix and text.startswith("search_query:"):
         text = text[len("search_query:"):].strip()
+    # та же каноническая форма, что у чанков в индексе (ответ LLM может вернуть ё, «», —)
+    text = NORMALIZER.normalize(text)
     
     # Токенизация
     inputs = tokenizer(
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from chat.realtime import publish_chat_event
+
+from .models import AskJob
+from .answering import parse_answer, bot_message_serializer
+from .llm import LLMError
+from .scheduler import LLMOverloaded
+
+VISIBILITY_TIMEOUT = 300   # сек.: running-задача без подтверждения снова становится доступной
+RETRY_BACKOFF = 10         # сек.: задержка ретрая, удваивается с каждой попыткой
+MAX_ATTEMPTS = 3
+CLAIM_BATCH = 10
+
+
+def enqueue(chat, user, question):
+    return AskJob.objects.create(
+        chat=chat,
+        user=user,
+        question=question,
+        max_attempts=getattr(settings, "RAG_JOB_MAX_ATTEMPTS", MAX_ATTEMPTS),
+    )
+
+
+def _dead_letter(job, error):
+    AskJob.objects.filter(id=job.id, attempts=job.attempts).update(
+        status='dead', locked_by='', last_error=error, updated_at=timezone.now(),
+    )
+
+
+def claim(worker_id, visibility_timeout=None):
+    """
+    Берёт следующую доступную задачу: queued с наступившим available_at
+    или running с истёкшим visibility timeout (воркер упал).
+    Захват — условный UPDATE по (status, attempts), поэтому задачу
+    получает ровно один воркер и на Postgres, и на SQLite.
+    """
+    visibility_timeout = visibility_timeout or getattr(settings, "RAG_JOB_VISIBILITY_TIMEOUT", VISIBILITY_TIMEOUT)
+    now = timezone.now()
+    candidates = (
+        AskJob.objects
+        .filter(status__in=['queued', 'running'], available_at__lte=now)
+        .order_by('available_at', 'created_at')
+    )
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        batch = list(candidates.only('id', 'status', 'attempts', 'max_attempts', 'last_error')[:CLAIM_BATCH])
+
+        for job in batch:
+            if job.attempts >= job.max_attempts:
+                # running с исчерпанными попытками: воркер не отчитался ни разу из max_attempts
+                _dead_letter(job, job.last_error or "visibility timeout exceeded")
+                continue
+            claimed = AskJob.objects.filter(id=job.id, status=job.status, attempts=job.attempts).update(
+                status='running',
+                attempts=F('attempts') + 1,
+                locked_by=worker_id,
+                available_at=now + timedelta(seconds=visibility_timeout),
+                updated_at=now,
+            )
+            if claimed:
+                return AskJob.objects.select_related('chat', 'question').get(id=job.id)
+    return None
+
+
+def _owned(job):
+    """Аренда ещё наша: задачу не перехватил другой воркер после visibility timeout"""
+    return AskJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by, attempts=job.attempts)
+
+
+def complete(job, answer_message, citations):
+    return _owned(job).update(
+        status='done', answer=answer_message, citations=citations,
+        locked_by='', last_error='', updated_at=timezone.now(),
+    ) == 1
+
+
+def fail(job, error):
+    """Ретрай с экспоненциальной задержкой или dead-letter после max_attempts"""
+    if job.attempts >= job.max_attempts:
+        _owned(job).update(status='dead', locked_by='', last_error=error, updated_at=timezone.now())
+        return 'dead'
+    delay = getattr(settings, "RAG_JOB_RETRY_BACKOFF", RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+    _owned(job).update(
+        status='queued', locked_by='', last_error=error,
+        available_at=timezone.now() + timedelta(seconds=delay), updated_at=timezone.now(),
+    )
+    return 'queued'
+
+
+def process(job, pipeline):
+    """
+    Выполняет задачу: ответ из RAG пайплайна -> сообщение бота -> done.
+    Сбой или перегрузка LLM — ретрай с задержкой (fail), а не ответ "на оператора".
+    Возвращает итоговый статус: 'done', 'queued', 'dead' или 'lost' (аренду перехватили).
+    """
+    try:
+        answer = pipeline(
+            job.question.text,
+            user_id=str(job.user_id),
+            on_token=lambda text: publish_chat_event(job.chat_id, {"type": "token", "text": text}),
+        )
+    except (LLMOverloaded, LLMError) as e:
+        return fail(job, str(e))
+    answer_text, sources = parse_answer(answer)
+
+    with transaction.atomic():
+        out_msg_ser = bot_message_serializer(job.chat, answer_text)
+        out_msg_ser.is_valid(raise_exception=True)
+        out_msg = out_msg_ser.save()
+        if not complete(job, out_msg, sources):
+            # аренду перехватили — ответ запишет другой воркер
+            transaction.set_rollback(True)
+            return 'lost'
+    return 'done'
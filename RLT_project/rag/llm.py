@@ -0,0 +1,151 @@
+import json
+import logging
+
+import httpx
+
+from .conf import get_setting
+from .scheduler import SCHEDULER, PRIORITY_ANSWER, LLMOverloaded
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_MODEL = "gpt-oss:20b"
+BACKEND = "ollama"
+REQUEST_TIMEOUT = 300.0
+KEEP_ALIVE = "30m"   # держим модель (и её KV-кэш префиксов) в памяти между запросами
+
+
+class LLMError(Exception):
+    """LLM не дала ответа: сервер недоступен или вернул ошибку"""
+
+# Профили генерации: уровень рассуждений gpt-oss, лимит новых токенов
+# (рассуждения + ответ), стоп-последовательности, температура.
+GENERATION_PROFILES = {
+    # нормализация: нужна ровно одна строка "search_query: ..."
+    "normalize": {"think": "low", "num_predict": 256, "stop": ["\n"], "temperature": 0.0},
+    # ответ пользователю: ограниченный бюджет рассуждений и длины
+    "answer": {"think": "medium", "num_predict": 1024, "stop": [], "temperature": 0.2},
+}
+
+
+def get_profile(name):
+    profile = dict(GENERATION_PROFILES[name])
+    profile.update(get_setting("RAG_LLM_PROFILES", {}).get(name, {}))
+    return profile
+
+
+def _log_usage(profile_name, data):
+    """Сколько токенов ушло на рассуждения, а сколько на ответ"""
+    thinking = data.get("thinking") or ""
+    response = data.get("response") or ""
+    eval_count = data.get("eval_count", 0)
+    # Ollama отдаёт общий eval_count; делим пропорционально длине каналов
+    chars = len(thinking) + len(response)
+    thinking_tokens = round(eval_count * len(thinking) / chars) if chars else 0
+    logger.info(
+        "llm %s: prompt=%s tokens (prefill %.2fs), thinking≈%s tokens, answer≈%s tokens, eval=%.2fs, done=%s",
+        profile_name,
+        data.get("prompt_eval_count", 0),
+        data.get("prompt_eval_duration", 0) / 1e9,
+        thinking_tokens,
+        eval_count - thinking_tokens,
+        data.get("eval_duration", 0) / 1e9,
+        data.get("done_reason", ""),
+    )
+
+
+def build_payload(prompt: str, system: str = None, profile_name="answer"):
+    profile = get_profile(profile_name)
+    payload = {
+        "model": get_setting("RAG_OLLAMA_MODEL", OLLAMA_MODEL),
+        "prompt": prompt,
+        "stream": False,
+        "think": profile["think"],
+        "keep_alive": get_setting("RAG_OLLAMA_KEEP_ALIVE", KEEP_ALIVE),
+        "options": {
+            "num_predict": profile["num_predict"],
+            "stop": profile["stop"],
+            "temperature": profile["temperature"],
+        },
+    }
+    if system is not None:
+        # статичный системный сегмент: одинаковый префикс -> сервер не пересчитывает его prefill
+        payload["system"] = system
+    return payload
+
+
+def post_generate(payload):
+    """Сырой ответ /api/generate (с prompt_eval_count, prompt_eval_duration и т.д.)"""
+    r = httpx.post(
+        get_setting("RAG_OLLAMA_URL", OLLAMA_URL) + "/api/generate",
+        json=payload,
+        timeout=REQUEST_TIMEOUT,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def stream_generate(payload, on_token):
+    """
+    Потоковый /api/generate: каждый фрагмент ответа (не рассуждений) уходит в on_token,
+    возвращается итоговая запись со склеенными response/thinking и счётчиками.
+    """
+    payload = dict(payload, stream=True)
+    response, thinking, data = [], [], {}
+    with httpx.stream(
+        "POST",
+        get_setting("RAG_OLLAMA_URL", OLLAMA_URL) + "/api/generate",
+        json=payload,
+        timeout=REQUEST_TIMEOUT,
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            thinking.append(chunk.get("thinking") or "")
+            piece = chunk.get("response") or ""
+            if piece:
+                response.append(piece)
+                on_token(piece)
+            if chunk.get("done"):
+                data = chunk
+    data["response"] = "".join(response)
+    data["thinking"] = "".join(thinking)
+    return data
+
+
+def _generate(prompt: str, system: str, profile_name: str, on_token=None) -> str:
+    """Вызов локальной модели gpt-oss:20b через HTTP API Ollama"""
+    payload = build_payload(prompt, system, profile_name)
+    try:
+        data = stream_generate(payload, on_token) if on_token else post_generate(payload)
+    except httpx.HTTPError as e:
+        raise LLMError(f"{BACKEND}: {e}") from e
+
+    _log_usage(profile_name, data)
+    # рассуждения приходят отдельным полем "thinking" и в ответ не попадают
+    text = (data.get("response") or "").strip()
+    if data.get("done_reason") == "length":
+        # num_predict ограничивает рассуждения и ответ вместе: обрезанный ответ не отдаём
+        logger.warning(
+            "llm %s: ответ обрезан лимитом num_predict=%s (ответ %s символов) — отброшен",
+            profile_name, payload["options"]["num_predict"], len(text),
+        )
+        return ""
+    if not text:
+        logger.warning("llm %s: пустой ответ (done_reason=%s)", profile_name, data.get("done_reason", ""))
+    return text
+
+
+def call_llm(prompt: str, system: str = None, profile="answer", priority=PRIORITY_ANSWER, user_id=None,
+             on_token=None) -> str:
+    """
+    Вызов LLM через планировщик: ждёт слот бэкенда в очереди с приоритетом.
+    При перегрузке бросает LLMOverloaded, при сбое сервера — LLMError:
+    вызывающий код решает, как деградировать. Пустая строка — модель не уложилась
+    в num_predict профиля или ничего не ответила.
+    on_token — callback для потоковой выдачи фрагментов ответа.
+    """
+    with SCHEDULER.slot(BACKEND, priority, user_id):
+        return _generate(prompt, system, profile, on_token=on_token)
@@ -1,27 +1,51 @@
-import subprocess
+import logging
+
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from .normalize_query import normalise_query, TERMINS
 from .embed_query import get_embedding 
+from .chunk_store import get_store
+from .llm import call_llm
+from .scheduler import PRIORITY_ANSWER
+from .conf import get_setting
+from .rerank import RERANKER, DEFAULT_CANDIDATES, rerank_enabled
+from .prompts import PromptTemplate
+from .answering import parse_answer
+
+logger = logging.getLogger(__name__)
 
 # === 1. Подключение к Qdrant ===
 client = QdrantClient(url="localhost:6333")
 collection_name = "data_files"
 
+OPERATOR_FALLBACK = "Перевод на оператора"
+TOP_K = 3
 
-# === 2. Вызов локальной модели GPT-OSS:20b через Ollama ===
-def _call_local_gpt(prompt: str) -> str:
-    try:
-        result = subprocess.run(
-            ["ollama", "run", "gpt-oss:20b"],
-            input=prompt,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return f"search_query: ERROR {e.stderr.strip()}"
+# Статичные инструкции — первыми и без подстановок; вопрос пользователя — последним
+ANSWER_TEMPLATE = PromptTemplate(
+    system="""Ты — экспертная система поддержки пользователей.
+У тебя есть база знаний и вопрос пользователя (ниже).
+
+Задачи:
+1. Определи категорию запроса:
+   - "ответ по работе пользователя"
+   - "ответ по проблеме"
+   - "ответ на термин"
+2. Сформулируй понятный ответ для пользователя, основываясь на базе знаний.
+3. В конце добавь строку: "Источник: <ссылка из строки ИСТОЧНИК>"
+4. Если информации недостаточно, напиши: "Перевод на оператора".
+""",
+    parts=[
+        "База знаний:\n{context}\n\nИСТОЧНИК: {source}\n\n",
+        "Пользователь задал вопрос: \"{question}\".",
+    ],
+)
+
+
+# === 2. Вызов локальной модели GPT-OSS:20b через Ollama (профиль ответа) ===
+def _call_local_gpt(prompt: str, system: str = None, user_id=None, on_token=None) -> str:
+    return call_llm(prompt, system=system, profile="answer", priority=PRIORITY_ANSWER, user_id=user_id,
+                    on_token=on_token)
 
 
 # === 3. Поиск релевантных документов в Qdrant ===
@@ -35,52 +59,108 @@ def search_in_qdrant(query: str, top_k: int = 3):
     return hits
 
 
-# === 4. Основной пайплайн RAG ===
-def rag_pipeline(user_message: str):
-    # Нормализация запроса (если у тебя есть такие правила)
-    normalized_query = normalise_query(user_message, TERMINS)
-
-    # Шаг 1: Поиск кандидатов в Qdrant
-    hits = search_in_qdrant(normalized_query, top_k=3)
+# === 4. Сборка контекста из найденных чанков ===
+def resolve_hit(hit):
+    """
+    (title, url, text) чанка: текст берётся из общего хранилища по payload["chunk_id"];
+    payload без chunk_id (старые коллекции) используется как есть.
+    None — точка проиндексирована другой сборкой хранилища (make_chunks без index_chunks):
+    номер указывает на чужой чанк, а текста в payload нет.
+    """
+    payload = hit.payload
+    if "chunk_id" not in payload:
+        return payload["title"], payload["url"], payload["text"]
+    store = get_store()
+    i = payload["chunk_id"]
+    if "build" in payload:
+        fresh = payload["build"] == store.build_id
+    else:
+        fresh = i < len(store) and payload.get("url", store.url(i)) == store.url(i)
+    if not fresh:
+        return None
+    return store.title(i), store.url(i), store.text(i)
+
+
+def fresh_hits(hits):
+    """Хиты, которые соответствуют текущему хранилищу; остальные — в лог ошибок"""
+    fresh = [hit for hit in hits if resolve_hit(hit) is not None]
+    if len(fresh) < len(hits):
+        logger.error(
+            "Qdrant '%s': %s из %s найденных чанков от другой сборки хранилища (%s) — "
+            "пропущены; переиндексируйте: manage.py index_chunks --recreate",
+            collection_name, len(hits) - len(fresh), len(hits), get_store().build_id,
+        )
+    return fresh
 
-    if not hits:
-        return "Перевод на оператора"
 
-    # Шаг 2: Собираем контекст из найденных статей
+def build_context(hits):
     context_parts = []
     sources = []
     for hit in hits:
-        payload = hit.payload
-        context_parts.append(f"{payload['title']} ({payload['url']}): {payload['text']}")
-        sources.append(payload['url'])
+        title, url, text = resolve_hit(hit)
+        context_parts.append(f"{title} ({url}): {text}")
+        sources.append(url)
+
+    return "\n\n".join(context_parts), sources
+
+
+def rerank_hits(query: str, hits, top_k: int = TOP_K):
+    """
+    Оставляет top_k кандидатов по оценке cross-encoder'а (пусто — ничего релевантного).
+    Этап необязательный: модель не загрузилась или упала — порядок bi-encoder'а.
+    """
+    if not rerank_enabled():
+        return hits[:top_k]
+    if query.startswith("search_query:"):
+        query = query[len("search_query:"):].strip()
+    keys = [hit.payload.get("chunk_id", hit.id) for hit in hits]
+    texts = [resolve_hit(hit)[2] for hit in hits]
+    try:
+        order = RERANKER.rank(query, keys, texts, top_k=top_k)
+    except Exception:
+        logger.exception("Реранжирование недоступно (%s) — порядок Qdrant", RERANKER.model_path)
+        return hits[:top_k]
+    return [hits[i] for i in order]
+
+
+# === 5. Основной пайплайн RAG ===
+def rag_pipeline(user_message: str, user_id=None, on_token=None):
+    """
+    Ответ на вопрос пользователя. Сбои LLM на шаге ответа (LLMOverloaded, LLMError)
+    пробрасываются: синхронный API переводит на оператора, воркер очереди — ретраит.
+    """
+    # Нормализация запроса (если у тебя есть такие правила)
+    normalized_query = normalise_query(user_message, TERMINS, user_id=user_id)
 
-    context = "\n\n".join(context_parts)
+    # Шаг 1: Поиск кандидатов в Qdrant (широкая воронка под реранжирование)
+    if rerank_enabled():
+        candidates = get_setting("RAG_RERANK_CANDIDATES", DEFAULT_CANDIDATES)
+    else:
+        candidates = TOP_K
+    hits = fresh_hits(search_in_qdrant(normalized_query, top_k=max(candidates, TOP_K)))
 
-    # Шаг 3: Формируем prompt для LLM
-    prompt = f"""
-Ты — экспертная система поддержки пользователей.
-У тебя есть база знаний (ниже).
-Пользователь задал вопрос: "{user_message}".
+    if not hits:
+        return OPERATOR_FALLBACK
 
-База знаний:
-{context}
+    # Шаг 1.1: Реранжирование; нет релевантных чанков — LLM не вызываем
+    hits = rerank_hits(normalized_query, hits, top_k=TOP_K)
+    if not hits:
+        return OPERATOR_FALLBACK
 
-Задачи:
-1. Определи категорию запроса:
-   - "ответ по работе пользователя"
-   - "ответ по проблеме"
-   - "ответ на термин"
-2. Сформулируй понятный ответ для пользователя, основываясь на базе знаний.
-3. В конце добавь строку: "Источник: {sources[0]}"
-4. Если информации недостаточно, напиши: "Перевод на оператора".
-"""
+    # Шаг 2: Собираем контекст из найденных статей
+    context, sources = build_context(hits)
+
+    # Шаг 3: Формируем prompt для LLM
+    system, prompt = ANSWER_TEMPLATE.render(context=context, source=sources[0], question=user_message)
 
-    # Шаг 4: Ответ от GPT-OSS
-    llm_answer = _call_local_gpt(prompt)
+    # Шаг 4: Ответ от GPT-OSS; пустой или обрезанный лимитом ответ — на оператора
+    llm_answer = _call_local_gpt(prompt, system=system, user_id=user_id, on_token=on_token)
+    if not parse_answer(llm_answer)[0]:
+        return OPERATOR_FALLBACK
     return llm_answer
 
 
-# === 5. Пример использования ===
+# === 6. Пример использования ===
 if __name__ == "__main__":
     test_query = "Как зарегистрироваться поставщику по 44-ФЗ?"
     answer = rag_pipeline(test_query)
@@ -0,0 +1,71 @@
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chat.realtime import get_channel_layer
+from ... import jobs
+from ...main_rag import rag_pipeline
+
+
+class Command(BaseCommand):
+    help = "Пул воркеров асинхронных задач /api/ask/ (очередь AskJob в БД)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Число потоков-воркеров")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Пауза при пустой очереди, сек.")
+        parser.add_argument("--visibility-timeout", type=int, default=None,
+                            help="Через сколько секунд невыполненная задача снова доступна")
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь и завершиться")
+
+    def handle(self, *args, workers, poll_interval, visibility_timeout, once, **kwargs):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=(f"{prefix}:{n}", stop, poll_interval, visibility_timeout, once),
+                daemon=True,
+            )
+            for n in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f"✅ Запущено воркеров: {workers} ({prefix})"))
+        if getattr(get_channel_layer(), "single_process", False):
+            self.stderr.write(self.style.WARNING(
+                "⚠️ InMemoryChannelLayer: токены ответов не дойдут до WebSocket веб-процессов "
+                "(нужен CHAT_CHANNEL_LAYER = 'chat.realtime.RedisChannelLayer'), клиенты увидят только итог"
+            ))
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1.0)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+
+    def _loop(self, worker_id, stop, poll_interval, visibility_timeout, once):
+        while not stop.is_set():
+            close_old_connections()
+            job = jobs.claim(worker_id, visibility_timeout)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+
+            try:
+                status = jobs.process(job, rag_pipeline)
+                self.stdout.write(f"[{worker_id}] {job.id}: {status}")
+            except Exception as e:
+                status = jobs.fail(job, str(e))
+                self.stderr.write(f"[{worker_id}] {job.id}: {status} ({e})")
+        close_old_connections()
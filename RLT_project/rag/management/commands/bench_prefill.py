@@ -0,0 +1,60 @@
+import statistics
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from ...llm import build_payload, post_generate
+from ...normalize_query import NORMALIZE_TEMPLATE, normalize_basic
+from ...main_rag import ANSWER_TEMPLATE
+from ...search import search
+
+QUERIES = [
+    "Как зарегистрироваться поставщику по 44-ФЗ?",
+    "Какие требования к электронной подписи по 223-ФЗ?",
+    "Как подать жалобу в ФАС по 44-ФЗ?",
+    "Инструкция по работе с ЕИС для начинающих",
+    "Как получить машиночитаемую доверенность для ЭДО?",
+    "Что делать, если не приходит код подтверждения в личный кабинет?",
+]
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк prefill: время обработки промпта с общим статичным префиксом и без него"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--template", choices=["normalize", "answer"], default="answer")
+        parser.add_argument("--runs", type=int, default=12)
+
+    def _render(self, template, query):
+        if template == "normalize":
+            return NORMALIZE_TEMPLATE.render(query=normalize_basic(query))
+        hits = search(query, top_k=3)
+        context = "\n\n".join(f"{h['title']} ({h['url']}): {h['text']}" for h in hits)
+        return ANSWER_TEMPLATE.render(context=context, source=hits[0]["url"], question=query)
+
+    def _measure(self, template, runs, reuse):
+        durations, tokens = [], []
+        for n in range(runs):
+            system, prompt = self._render(template, QUERIES[n % len(QUERIES)])
+            if not reuse:
+                # уникальная первая строка ломает совпадение префикса с прошлым запросом
+                system = f"[{uuid.uuid4()}]\n" + system
+            payload = build_payload(prompt, system, "normalize")
+            payload["options"]["num_predict"] = 1
+            data = post_generate(payload)
+            durations.append(data.get("prompt_eval_duration", 0) / 1e6)
+            tokens.append(data.get("prompt_eval_count", 0))
+        return durations, tokens
+
+    def handle(self, *args, template, runs, **kwargs):
+        # прогрев: модель загружена, статичный префикс уже в кэше
+        self._measure(template, 1, reuse=True)
+
+        self.stdout.write(f"Шаблон: {template}, запусков: {runs}")
+        self.stdout.write(f"{'режим':<16}{'prefill p50, мс':>18}{'prefill mean, мс':>20}{'токенов prefill':>18}")
+        for label, reuse in (("с префиксом", True), ("без префикса", False)):
+            durations, tokens = self._measure(template, runs, reuse)
+            self.stdout.write(
+                f"{label:<16}{statistics.median(durations):>18.1f}"
+                f"{statistics.mean(durations):>20.1f}{statistics.mean(tokens):>18.0f}"
+            )
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...embed_query import export_mmap_weights
+
+
+class Command(BaseCommand):
+    help = "Экспортирует веса RoSBERTa в файл для общей загрузки через mmap (RAG_EMBED_WEIGHTS_MMAP)"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="Куда сохранить (по умолчанию RAG_EMBED_WEIGHTS_MMAP)")
+
+    def handle(self, *args, path=None, **kwargs):
+        path = path or getattr(settings, "RAG_EMBED_WEIGHTS_MMAP", None)
+        if not path:
+            raise CommandError("Укажите --path или RAG_EMBED_WEIGHTS_MMAP в settings")
+        export_mmap_weights(path)
+        self.stdout.write(self.style.SUCCESS(f"✅ Веса сохранены → {path}"))
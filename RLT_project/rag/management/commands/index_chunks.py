@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from qdrant_client.http import models
+
+from ...chunk_store import get_store
+from ...embed_query import get_embedding
+from ...main_rag import client, collection_name
+
+
+class Command(BaseCommand):
+    help = "Загружает чанки из компактного хранилища в Qdrant (в payload только chunk_id, сборка, title, url)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--recreate", action="store_true", help="Пересоздать коллекцию")
+
+    def handle(self, *args, batch_size, recreate, **kwargs):
+        store = get_store()
+
+        if recreate:
+            client.recreate_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(
+                    size=768,        # размерность эмбеддингов RoSBERTa
+                    distance=models.Distance.COSINE,
+                ),
+            )
+
+        points = []
+        for i in range(len(store)):
+            # текст не дублируем в Qdrant — контекст собирается из хранилища
+            points.append(models.PointStruct(
+                id=i,
+                vector=get_embedding(store.text(i), remove_prefix=False).tolist(),
+                payload={"chunk_id": i, "build": store.build_id, "title": store.title(i), "url": store.url(i)},
+            ))
+            if len(points) >= batch_size:
+                client.upsert(collection_name=collection_name, wait=True, points=points)
+                points = []
+        if points:
+            client.upsert(collection_name=collection_name, wait=True, points=points)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Загружено {len(store)} чанков (сборка {store.build_id}) в коллекцию '{collection_name}'"
+        ))
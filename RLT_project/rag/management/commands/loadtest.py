@@ -0,0 +1,266 @@
+import asyncio
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.testcases import LiveServerThread
+
+from ... import llm, main_rag
+from ...chunk_store import get_store
+from ...scheduler import SCHEDULER
+
+# Типичные вопросы пользователей площадки
+QUERIES = [
+    "Как зарегистрироваться поставщику по 44-ФЗ?",
+    "Какие требования к электронной подписи по 223-ФЗ?",
+    "Как подать жалобу в ФАС по 44-ФЗ?",
+    "Инструкция по работе с ЕИС для начинающих",
+    "Как оформить ЭДО для 44 фз и использовать ЛК оператора?",
+    "Где взять машиночитаемую доверенность для подписания контракта?",
+    "Сколько стоит тариф для участия в коммерческих закупках?",
+    "Как вернуть обеспечение заявки после окончания процедуры?",
+    "Почему не проходит аккредитация в секции КОРП?",
+    "Как подать заявку на участие в аукционе 223 фз для МСП?",
+    "Что делать, если ЭП не видна в личном кабинете?",
+    "Как продлить аккредитацию на площадке Росэлторг?",
+    "Какие документы нужны для регистрации в ЕРУЗ?",
+    "Как заключить контракт по итогам электронного аукциона?",
+    "Не приходит письмо с подтверждением регистрации, что делать?",
+    "Как подписать УПД в системе ЭДО?",
+    "Где посмотреть протокол подведения итогов закупки?",
+    "Как внести денежные средства на лицевой счёт для обеспечения заявки?",
+    "Как участвовать в закупках малого объёма Росатома?",
+    "Какие сроки размещения извещения по 44-ФЗ?",
+]
+
+
+class Latency:
+    """Логнормальная задержка по p50/p95 в мс: "800,2500" (или одно число — константа)"""
+
+    def __init__(self, spec):
+        parts = [float(x) for x in spec.split(",")]
+        self.p50 = parts[0] / 1000
+        p95 = (parts[1] if len(parts) > 1 else parts[0]) / 1000
+        self.sigma = max(math.log(p95 / self.p50) / 1.645, 0.0) if self.p50 > 0 else 0.0
+
+    def sample(self):
+        if self.p50 <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.p50), self.sigma)
+
+
+class FakeLLM:
+    """Замена HTTP-вызова Ollama: планировщик, профили и шаблоны остаются в контуре"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def __call__(self, prompt, system, profile_name, on_token=None):
+        time.sleep(self.latencies[profile_name].sample())
+        if profile_name == "normalize":
+            query = prompt.split("<<<USER\n", 1)[-1].split("\nUSER>>>", 1)[0]
+            return "search_query: " + query
+        source = prompt.split("ИСТОЧНИК: ", 1)[-1].split("\n", 1)[0]
+        answer = "Ответ по базе знаний для нагрузочного теста.\n\nИсточник: " + source
+        if on_token:
+            for word in answer.split(" "):
+                on_token(word + " ")
+        return answer
+
+
+class FakeQdrant:
+    """Замена search_in_qdrant: случайные чанки из хранилища с заданной задержкой"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        store = get_store()
+        self.size = len(store)
+        self.build = store.build_id
+
+    def __call__(self, query, top_k=3):
+        time.sleep(self.latency.sample())
+        ids = random.sample(range(self.size), min(top_k, self.size))
+        return [SimpleNamespace(id=i, score=1.0 - n / 100, payload={"chunk_id": i, "build": self.build}) for n, i in enumerate(ids)]
+
+
+class FakeReranker:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def rank(self, query, keys, texts, top_k=3, threshold=None, budget=None):
+        time.sleep(self.latency.sample())
+        return list(range(min(top_k, len(keys))))
+
+
+class QueryCountingHandler:
+    """WSGI-обёртка: число SQL-запросов обработки отдаётся в заголовке X-DB-Queries"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        def counted_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [("X-DB-Queries", str(count[0]))], exc_info)
+
+        with connection.execute_wrapper(counter):
+            return self.app(environ, counted_start_response)
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест /api/ask/ и /api/feedback/ с локальными заменами LLM и Qdrant"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rps", type=float, default=5.0, help="Целевая интенсивность запросов /api/ask/")
+        parser.add_argument("--concurrency", type=int, default=32, help="Максимум одновременных запросов")
+        parser.add_argument("--duration", type=float, default=30.0, help="Длительность подачи нагрузки, сек.")
+        parser.add_argument("--users", type=int, default=50, help="Число сессий (пользователь + чат)")
+        parser.add_argument("--feedback-ratio", type=float, default=0.3, help="Доля ответов с оценкой")
+        parser.add_argument("--normalize-latency", default="400,1200", help="LLM нормализации: p50,p95 мс")
+        parser.add_argument("--answer-latency", default="3000,9000", help="LLM ответа: p50,p95 мс")
+        parser.add_argument("--search-latency", default="15,60", help="Qdrant: p50,p95 мс")
+        parser.add_argument("--rerank-latency", default="80,200", help="Реранжирование: p50,p95 мс")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Таймаут HTTP клиента, сек.")
+        parser.add_argument("--keepdb", action="store_true", help="Не пересоздавать тестовую БД")
+
+    def handle(self, *args, **opts):
+        self._install_fakes(opts)
+
+        db_name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            # файловая тестовая БД: у каждого потока сервера своё соединение
+            test_name = os.path.join(tempfile.gettempdir(), "rlt_loadtest.sqlite3")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = test_name
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=opts["keepdb"])
+
+        server = LiveServerThread("127.0.0.1", QueryCountingHandler)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise CommandError(f"Сервер не запустился: {server.error}")
+
+        # feedback_view пишет feedback_log.jsonl в текущий каталог — не трогаем настоящий лог
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                base_url = f"http://127.0.0.1:{server.port}"
+                self.stdout.write(f"Сервер: {base_url}, БД: {connection.vendor}")
+                results, elapsed = asyncio.run(self._drive(base_url, opts))
+            finally:
+                os.chdir(cwd)
+                server.terminate()
+                connection.creation.destroy_test_db(db_name, verbosity=0, keepdb=opts["keepdb"])
+
+        self._report(results, elapsed)
+
+    def _install_fakes(self, opts):
+        llm._generate = FakeLLM({
+            "normalize": Latency(opts["normalize_latency"]),
+            "answer": Latency(opts["answer_latency"]),
+        })
+        main_rag.search_in_qdrant = FakeQdrant(Latency(opts["search_latency"]))
+        main_rag.RERANKER = FakeReranker(Latency(opts["rerank_latency"]))
+
+    async def _drive(self, base_url, opts):
+        results = defaultdict(list)   # endpoint -> [(status, latency, db_queries)]
+        sessions = [{} for _ in range(opts["users"])]
+        semaphore = asyncio.Semaphore(opts["concurrency"])
+        limits = httpx.Limits(max_connections=opts["concurrency"], max_keepalive_connections=opts["concurrency"])
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=opts["timeout"], limits=limits) as client:
+
+            async def request(endpoint, body, scheduled):
+                async with semaphore:
+                    try:
+                        r = await client.post(endpoint, json=body)
+                        status, queries = r.status_code, int(r.headers.get("X-DB-Queries", 0))
+                        data = r.json() if r.headers.get("content-type", "").startswith("application/json") else {}
+                    except httpx.HTTPError as e:
+                        status, queries, data = type(e).__name__, 0, {}
+                # задержка от запланированного момента отправки, а не от захвата семафора
+                results[endpoint].append((status, time.monotonic() - scheduled, queries))
+                return status, data
+
+            async def session_turn(session, scheduled):
+                question = random.choice(QUERIES)
+                status, data = await request("/api/ask/", {
+                    "question": question,
+                    "user_id": session.get("user_id"),
+                    "chat_id": session.get("chat_id"),
+                }, scheduled)
+                if status == 200 and data.get("ids"):
+                    session["user_id"], session["chat_id"] = data["ids"]["user"], data["ids"]["chat"]
+                    if random.random() < opts["feedback_ratio"]:
+                        await request("/api/feedback/", {
+                            "type": random.choice(["like", "like", "dislike"]),
+                            "question": question,
+                            "answer": data.get("answer"),
+                        }, time.monotonic())
+
+            # открытая модель нагрузки: пуассоновский поток с интенсивностью rps
+            tasks = []
+            started = time.monotonic()
+            next_at = started
+            while next_at - started < opts["duration"]:
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+                tasks.append(asyncio.create_task(session_turn(random.choice(sessions), next_at)))
+                next_at += random.expovariate(opts["rps"])
+            await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - started
+
+        return results, elapsed
+
+    def _report(self, results, elapsed):
+        self.stdout.write(f"\nДлительность: {elapsed:.1f} с")
+        self.stdout.write(
+            f"{'endpoint':<16}{'req':>7}{'rps':>8}{'err %':>8}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+            f"{'db avg':>8}{'db p95':>8}{'db max':>8}"
+        )
+        for endpoint, rows in sorted(results.items()):
+            ok = [lat for status, lat, _ in rows if status == 200]
+            errors = sum(1 for status, _, _ in rows if status != 200)
+            queries = [q for status, _, q in rows if status == 200]
+            self.stdout.write(
+                f"{endpoint:<16}{len(rows):>7}{len(ok) / elapsed:>8.2f}{100 * errors / len(rows):>8.1f}"
+                + "".join(f"{_percentile(ok, p) * 1000:>9.0f}" for p in (50, 90, 95, 99, 100))
+                + f"{statistics.mean(queries) if queries else 0:>8.1f}"
+                f"{_percentile(queries, 95):>8}{max(queries, default=0):>8}"
+            )
+
+            codes = defaultdict(int)
+            for status, _, _ in rows:
+                if status != 200:
+                    codes[status] += 1
+            if codes:
+                self.stdout.write("    ошибки: " + ", ".join(f"{k}: {v}" for k, v in codes.items()))
+
+        self.stdout.write("\nПланировщик LLM:")
+        for backend, m in SCHEDULER.metrics().items():
+            self.stdout.write(
+                f"  {backend}: admitted={m['admitted']} rejected={m['rejected']} timed_out={m['timed_out']} "
+                f"wait_avg={m['wait_avg_s']}s wait_max={m['wait_max_s']}s"
+            )
@@ -1,11 +1,24 @@
 from django.core.management.base import BaseCommand
 from ...chunking import build_all_chunks
+from ...chunk_store import build_store, CHUNKS_PATH
 
 class Command(BaseCommand):
     help = "Чанкует parsed_data.json в тематические чанки"
 
-    def handle(self, *args, **kwargs):
-        count, path = build_all_chunks()
+    def add_arguments(self, parser):
+        parser.add_argument("--store-only", action="store_true",
+                            help="Только пересобрать хранилище из готового chunks.jsonl (например, после смены нормализации)")
+
+    def handle(self, *args, store_only=False, **kwargs):
+        if store_only:
+            path = CHUNKS_PATH
+        else:
+            count, path = build_all_chunks()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Успешно: создано {count} чанков → {path}"
+            ))
+
+        store = build_store(path)
         self.stdout.write(self.style.SUCCESS(
-            f"✅ Успешно: создано {count} чанков → {path}"
-        ))
\ No newline at end of file
+            f"✅ Компактное хранилище: {len(store)} чанков, {len(store.titles)} заголовков, {len(store.urls)} ссылок"
+        ))
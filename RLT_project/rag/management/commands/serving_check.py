@@ -0,0 +1,45 @@
+import psutil
+from django.core.management.base import BaseCommand, CommandError
+
+from ...serving import available_cores, process_report
+
+
+class Command(BaseCommand):
+    help = "Память и потоки воркеров gunicorn/uvicorn: общие ли веса моделей, нет ли переподписки ядер"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pid", type=int, required=True, help="PID мастер-процесса")
+
+    def handle(self, *args, pid, **kwargs):
+        try:
+            workers = psutil.Process(pid).children()
+        except psutil.NoSuchProcess:
+            raise CommandError(f"Процесс {pid} не найден")
+
+        rows = [process_report(pid)] + [process_report(w.pid) for w in workers]
+        self.stdout.write(
+            f"{'pid':>8}{'роль':>8}{'rss MB':>10}{'uss MB':>10}{'pss MB':>10}{'shared MB':>11}{'потоков':>9}"
+        )
+        for n, r in enumerate(rows):
+            self.stdout.write(
+                f"{r['pid']:>8}{'master' if n == 0 else 'worker':>8}{r['rss_mb']:>10}{r['uss_mb']:>10}"
+                f"{r['pss_mb']:>10}{r['shared_mb']:>11}{r['os_threads']:>9}"
+            )
+
+        # pss делит общие страницы между процессами: сумма pss — реальная память группы
+        total_rss = sum(r["rss_mb"] for r in rows)
+        total_pss = sum(r["pss_mb"] for r in rows)
+        self.stdout.write(f"\nСумма rss: {total_rss:.0f} MB, сумма pss: {total_pss:.0f} MB")
+        if len(workers) > 1 and total_pss and total_rss / total_pss < 1.5:
+            self.stdout.write(self.style.WARNING(
+                "Похоже, веса не общие: rss почти равна pss. Включите preload_app или RAG_EMBED_WEIGHTS_MMAP."
+            ))
+
+        cores = available_cores()
+        threads = sum(r["os_threads"] for r in rows[1:])
+        self.stdout.write(f"Ядер: {cores}, потоков у воркеров: {threads}")
+        if workers and threads > 4 * cores:
+            self.stdout.write(self.style.WARNING(
+                "Потоков заметно больше, чем ядер: проверьте RAG_TORCH_THREADS / число воркеров."
+            ))
@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...tuning import (
+    CHARS_PER_TOKEN, LABELS_PATH, PREFILL_TPS, RETRIEVERS,
+    evaluate, load_articles, load_labels, pareto_front, retrieve_for_chunking, save_labels, seed_from_feedback,
+)
+
+
+def _ints(value):
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+class Command(BaseCommand):
+    help = "Подбор chunk_size/overlap/top_k/глубины кандидатов: recall@k, MRR, токены и задержка (Pareto)"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--labels", default=str(LABELS_PATH), help="JSONL: {question, urls}")
+        parser.add_argument("--seed-feedback", default=None,
+                            help="Дополнить разметку лайками из feedback_log.jsonl и сохранить")
+        parser.add_argument("--retriever", choices=sorted(RETRIEVERS), default="dense",
+                            help="dense — эмбеддинги, как в /api/ask/ (по умолчанию); bm25 — rag.search")
+        parser.add_argument("--chunk-sizes", type=_ints, default=[500, 800, 1000, 1500])
+        parser.add_argument("--overlaps", type=_ints, default=[100, 200])
+        parser.add_argument("--top-k", type=_ints, default=[1, 3, 5])
+        parser.add_argument("--candidates", type=_ints, default=[10, 30],
+                            help="Глубина кандидатов под реранжирование (с --rerank)")
+        parser.add_argument("--rerank", action="store_true", help="Реранжировать кандидатов cross-encoder'ом")
+        parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                            help="Процессов на перестроение индексов BM25 (dense — в текущем процессе)")
+        parser.add_argument("--prefill-tps", type=float, default=PREFILL_TPS, help="Токенов/с на prefill")
+        parser.add_argument("--chars-per-token", type=float, default=CHARS_PER_TOKEN)
+        parser.add_argument("--recall-tolerance", type=float, default=0.0,
+                            help="Допустимая потеря recall относительно лучшей конфигурации")
+
+    def handle(self, *args, **opts):
+        labels = load_labels(opts["labels"])
+        if opts["seed_feedback"]:
+            added = seed_from_feedback(labels, opts["seed_feedback"])
+            save_labels(labels, opts["labels"])
+            self.stdout.write(f"Из обратной связи добавлено вопросов: {added}")
+        if not labels:
+            raise CommandError(f"Нет размеченных вопросов в {opts['labels']}")
+
+        from ...main_rag import ANSWER_TEMPLATE
+
+        reranker = None
+        if opts["rerank"]:
+            from ...rerank import CrossEncoderReranker
+            reranker = CrossEncoderReranker()
+        candidates = opts["candidates"] if reranker else [max(opts["top_k"])]
+        depth = max(candidates + opts["top_k"])
+
+        articles = load_articles()
+        questions = [item["question"] for item in labels]
+        grid = [(s, o) for s in opts["chunk_sizes"] for o in opts["overlaps"] if o < s]
+        retriever = opts["retriever"]
+        self.stdout.write(
+            f"Статей: {len(articles)}, вопросов: {len(labels)}, конфигураций чанкования: {len(grid)}, "
+            f"поиск: {retriever}"
+        )
+
+        if retriever == "dense":
+            # модель эмбеддингов одна на процесс и сама занимает все ядра
+            results = [
+                retrieve_for_chunking(articles, size, overlap, questions, depth, retriever)
+                for size, overlap in grid
+            ]
+        else:
+            # перестроение индексов BM25 — CPU-bound, по процессу на конфигурацию
+            with ProcessPoolExecutor(max_workers=max(1, min(opts["jobs"], len(grid)))) as pool:
+                futures = [
+                    pool.submit(retrieve_for_chunking, articles, size, overlap, questions, depth, retriever)
+                    for size, overlap in grid
+                ]
+                results = [f.result() for f in futures]
+
+        rows = []
+        for result in results:
+            self.stdout.write(
+                f"  chunk={result['chunk_size']}/{result['chunk_overlap']}: "
+                f"{result['chunks']} чанков, индекс за {result['build_s']:.1f} с"
+            )
+            for cand in candidates:
+                rows.extend(evaluate(
+                    result, labels, ANSWER_TEMPLATE, opts["top_k"], cand, reranker,
+                    prefill_tps=opts["prefill_tps"], chars_per_token=opts["chars_per_token"],
+                ))
+
+        self._report(rows, opts["recall_tolerance"])
+
+    def _report(self, rows, tolerance):
+        front = {id(r) for r in pareto_front(rows)}
+        rows = sorted(rows, key=lambda r: (r["latency_s"], -r["recall"]))
+
+        self.stdout.write(
+            f"\n{'':2}{'chunk':>6}{'overlap':>8}{'чанков':>8}{'top_k':>6}{'cand':>6}"
+            f"{'recall@k':>10}{'MRR':>7}{'токенов':>9}{'задержка, мс':>14}"
+        )
+        for r in rows:
+            mark = "* " if id(r) in front else "  "
+            self.stdout.write(
+                f"{mark}{r['chunk_size']:>6}{r['chunk_overlap']:>8}{r['chunks']:>8}{r['top_k']:>6}{r['candidates']:>6}"
+                f"{r['recall']:>10.3f}{r['mrr']:>7.3f}{r['tokens']:>9.0f}{r['latency_s'] * 1000:>14.0f}"
+            )
+        self.stdout.write("* — Pareto-оптимальные конфигурации")
+
+        # самая дешёвая конфигурация, не теряющая recall
+        best_recall = max(r["recall"] for r in rows)
+        ok = [r for r in rows if r["recall"] >= best_recall - tolerance]
+        pick = min(ok, key=lambda r: (r["latency_s"], r["tokens"]))
+        self.stdout.write(self.style.SUCCESS(
+            f"\nРекомендация ({pick['retriever']}): chunk_size={pick['chunk_size']}, chunk_overlap={pick['chunk_overlap']}, "
+            f"top_k={pick['top_k']}, кандидатов={pick['candidates']} "
+            f"(recall@k={pick['recall']:.3f}, MRR={pick['mrr']:.3f}, ~{pick['tokens']:.0f} токенов)"
+        ))
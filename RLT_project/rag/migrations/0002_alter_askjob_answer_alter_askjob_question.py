@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        ('rag', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='askjob',
+            name='answer',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AlterField(
+            model_name='askjob',
+            name='question',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.message'),
+        ),
+    ]
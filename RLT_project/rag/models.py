@@ -0,0 +1,40 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+from chat.models import User, Chat, Message
+
+
+class AskJob(models.Model):
+    """Задача асинхронного ответа на вопрос (очередь в БД, без внешнего брокера)"""
+    STATUSES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('dead', 'Не выполнено'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='ask_jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ask_jobs')
+    # chat_message секционирована по created_at: уникален только (id, created_at),
+    # поэтому внешний ключ на id без ограничения в БД (связь поддерживает Django)
+    question = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    answer = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                               db_constraint=False)
+    citations = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Когда задачу можно взять: отложенный ретрай или истечение visibility timeout у running
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f"{self.id}: {self.status} ({self.attempts}/{self.max_attempts})"
@@ -0,0 +1,20 @@
+import hashlib
+
+
+class PromptTemplate:
+    """
+    Шаблон промпта, упорядоченный от статичного к динамичному.
+    system — неизменная часть (байт-в-байт одинакова во всех вызовах), уходит в LLM
+    отдельным системным сегментом, и сервер переиспользует её KV-кэш;
+    parts — динамические блоки, от самых стабильных (база знаний) к самым
+    изменчивым (вопрос пользователя), который всегда стоит последним.
+    """
+
+    def __init__(self, system: str, parts):
+        self.system = system
+        self.parts = list(parts)
+        self.prefix_hash = hashlib.blake2b(system.encode("utf-8"), digest_size=8).hexdigest()
+
+    def render(self, **values):
+        """(system, prompt) для вызова LLM"""
+        return self.system, "".join(part.format(**values) for part in self.parts)
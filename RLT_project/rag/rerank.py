@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from .conf import get_setting
+
+# Небольшой локальный cross-encoder (русский, MS MARCO)
+RERANK_MODEL_PATH = "/home/user/cross-encoder-russian-msmarco/"
+
+DEFAULT_ENABLED = True
+DEFAULT_CANDIDATES = 30
+DEFAULT_THRESHOLD = 0.3        # вероятность релевантности пары (запрос, чанк)
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_LATENCY_BUDGET = 0.8   # сек. на весь этап реранжирования
+DEFAULT_CACHE_SIZE = 20_000
+
+
+def rerank_enabled():
+    """RAG_RERANK_ENABLED с общим для пайплайна и предзагрузки дефолтом"""
+    return get_setting("RAG_RERANK_ENABLED", DEFAULT_ENABLED)
+
+
+class CrossEncoderReranker:
+    """
+    Реранжирование кандидатов cross-encoder'ом на CPU батчами.
+    Оценки кэшируются по (хэш запроса, id чанка) в ограниченном LRU.
+    """
+
+    def __init__(self, model_path=RERANK_MODEL_PATH, batch_size=None, cache_size=None):
+        self.model_path = model_path
+        self.batch_size = batch_size or get_setting("RAG_RERANK_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.cache_size = cache_size or get_setting("RAG_RERANK_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _load(self):
+        # модель загружается при первом реранжировании, а не при импорте
+        with self._load_lock:
+            if self._model is None:
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+                model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+                model.eval()
+                self._model = model
+        return self._tokenizer, self._model
+
+    def load(self):
+        """Загрузка модели заранее (предзагрузка в мастере gunicorn)"""
+        self._load()
+
+    def clear_cache(self):
+        """Сброс кэша оценок (офлайн-замеры задержки без попаданий в кэш)"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key, score):
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score_batch(self, query, texts):
+        tokenizer, model = self._load()
+        inputs = tokenizer(
+            [query] * len(texts),
+            texts,
+            padding=True,
+            truncation=True,
+            return_tensors="pt",
+            max_length=512
+        )
+        with torch.no_grad():
+            logits = model(**inputs).logits
+        if logits.shape[-1] == 1:
+            probs = torch.sigmoid(logits[:, 0])
+        else:
+            probs = torch.softmax(logits, dim=-1)[:, 1]
+        return probs.tolist()
+
+    def rank(self, query, keys, texts, top_k=3, threshold=None, budget=None):
+        """
+        Возвращает индексы кандидатов (по убыванию оценки), прошедших порог.
+        Пустой список — ни один кандидат не релевантен (можно сразу звать оператора).
+        Если бюджет времени исчерпан, неоценённые кандидаты добавляются
+        в исходном порядке bi-encoder'а — решение «нет ответа» без оценок не принимаем.
+        """
+        threshold = get_setting("RAG_RERANK_THRESHOLD", DEFAULT_THRESHOLD) if threshold is None else threshold
+        budget = get_setting("RAG_RERANK_LATENCY_BUDGET", DEFAULT_LATENCY_BUDGET) if budget is None else budget
+        started = time.monotonic()
+        qhash = hashlib.blake2b(query.encode("utf-8"), digest_size=8).hexdigest()
+
+        scores = {}
+        pending = []
+        for i, key in enumerate(keys):
+            score = self._cache_get((qhash, key))
+            if score is None:
+                pending.append(i)
+            else:
+                scores[i] = score
+
+        while pending and time.monotonic() - started < budget:
+            batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+            for i, score in zip(batch, self._score_batch(query, [texts[i] for i in batch])):
+                scores[i] = score
+                self._cache_put((qhash, keys[i]), score)
+
+        kept = sorted((i for i, s in scores.items() if s >= threshold), key=lambda i: scores[i], reverse=True)
+        return (kept + pending)[:top_k]
+
+
+RERANKER = CrossEncoderReranker()
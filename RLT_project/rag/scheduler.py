@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from .conf import get_setting
+
+try:
+    import fcntl
+except ImportError:   # не POSIX — лимит только в пределах процесса
+    fcntl = None
+
+# Приоритеты: меньше — раньше. Ответ пользователю важнее нормализации запроса.
+PRIORITY_ANSWER = 0
+PRIORITY_NORMALIZE = 1
+PRIORITY_NAMES = {PRIORITY_ANSWER: "answer", PRIORITY_NORMALIZE: "normalize"}
+
+DEFAULT_CONCURRENCY = {"ollama": 1}
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_QUEUE_TIMEOUT = {"answer": 30.0, "normalize": 5.0}
+DEFAULT_SLOT_DIR = os.path.join(tempfile.gettempdir(), "rlt-llm-slots")
+SLOT_POLL_INTERVAL = 0.05
+
+
+class LLMOverloaded(Exception):
+    """Запрос не получил слот LLM: очередь заполнена или истёк дедлайн ожидания"""
+
+
+class HostSlots:
+    """
+    Слоты бэкенда на весь хост: flock на файлах <directory>/<backend>.<n>.lock.
+    Общие для всех процессов (воркеры gunicorn, ask_worker), блокировка снимается
+    ядром, если процесс упал. Без fcntl или с пустым directory — не ограничивают.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory if fcntl else ""
+
+    def _path(self, backend, n):
+        return os.path.join(self.directory, f"{backend}.{n}.lock")
+
+    def acquire(self, backend, limit, deadline):
+        """Дескриптор захваченного слота (None — ограничение выключено); LLMOverloaded по дедлайну"""
+        if not self.directory:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            for n in range(limit):
+                fd = os.open(self._path(backend, n), os.O_RDWR | os.O_CREAT, 0o666)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    os.close(fd)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMOverloaded(f"{backend}: все {limit} слотов хоста заняты")
+            time.sleep(min(SLOT_POLL_INTERVAL, remaining))
+
+    @staticmethod
+    def release(fd):
+        if fd is not None:
+            os.close(fd)   # закрытие снимает flock
+
+    def busy(self, backend, limit):
+        """Сколько слотов хоста занято сейчас (снимок для метрик)"""
+        if not self.directory:
+            return None
+        busy = 0
+        for n in range(limit):
+            try:
+                fd = os.open(self._path(backend, n), os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                busy += 1
+            finally:
+                os.close(fd)
+        return busy
+
+
+class _Backend:
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.cond = threading.Condition()
+        self.active = 0
+        self.queue = []                   # куча (priority, user_rank, seq)
+        self.pending = defaultdict(int)   # user_id -> запросов в очереди и в работе
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class LLMScheduler:
+    """
+    Допуск запросов к LLM: не больше limit одновременных вызовов на бэкенд,
+    остальные ждут в ограниченной очереди с приоритетами.
+    Внутри приоритета пользователи чередуются: запрос получает ранг, равный числу
+    уже ожидающих/выполняемых запросов того же пользователя.
+
+    Очередь и приоритеты — в пределах процесса; limit действует на весь хост:
+    допущенный запрос дополнительно берёт один из limit слотов HostSlots.
+    """
+
+    def __init__(self, concurrency=None, max_queue=None, queue_timeout=None, slot_dir=None):
+        self.concurrency = concurrency or get_setting("RAG_LLM_CONCURRENCY", DEFAULT_CONCURRENCY)
+        self.max_queue = max_queue or get_setting("RAG_LLM_MAX_QUEUE", DEFAULT_MAX_QUEUE)
+        self.queue_timeout = queue_timeout or get_setting("RAG_LLM_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)
+        if slot_dir is None:
+            slot_dir = get_setting("RAG_LLM_SLOT_DIR", DEFAULT_SLOT_DIR)
+        self.host_slots = HostSlots(slot_dir)
+        self._seq = itertools.count()
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def _backend(self, name):
+        with self._lock:
+            if name not in self._backends:
+                self._backends[name] = _Backend(name, self.concurrency.get(name, 1), self.max_queue)
+            return self._backends[name]
+
+    @contextmanager
+    def slot(self, backend, priority=PRIORITY_ANSWER, user_id=None, timeout=None):
+        """Блокирует до получения слота; LLMOverloaded — если ждать бессмысленно"""
+        b = self._backend(backend)
+        if timeout is None:
+            timeout = self.queue_timeout.get(PRIORITY_NAMES.get(priority), 30.0)
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with b.cond:
+            if len(b.queue) >= b.max_queue:
+                b.rejected += 1
+                raise LLMOverloaded(f"{backend}: очередь заполнена ({b.max_queue})")
+
+            entry = (priority, b.pending[user_id] if user_id else 0, next(self._seq))
+            heapq.heappush(b.queue, entry)
+            b.pending[user_id] += 1
+
+            while b.active >= b.limit or b.queue[0] is not entry:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    b.queue.remove(entry)
+                    heapq.heapify(b.queue)
+                    self._release_user(b, user_id)
+                    b.timed_out += 1
+                    b.cond.notify_all()
+                    raise LLMOverloaded(f"{backend}: слот не получен за {timeout:.1f} с")
+                b.cond.wait(remaining)
+
+            heapq.heappop(b.queue)
+            b.active += 1
+            # следующий в очереди мог стать первым, а свободные слоты ещё есть
+            b.cond.notify_all()
+
+        # слот хоста: его могут держать другие процессы
+        try:
+            host_slot = self.host_slots.acquire(backend, b.limit, deadline)
+        except LLMOverloaded:
+            with b.cond:
+                b.active -= 1
+                self._release_user(b, user_id)
+                b.timed_out += 1
+                b.cond.notify_all()
+            raise
+
+        with b.cond:
+            b.admitted += 1
+            waited = time.monotonic() - started
+            b.wait_total += waited
+            b.wait_max = max(b.wait_max, waited)
+
+        try:
+            yield
+        finally:
+            self.host_slots.release(host_slot)
+            with b.cond:
+                b.active -= 1
+                self._release_user(b, user_id)
+                b.cond.notify_all()
+
+    @staticmethod
+    def _release_user(b, user_id):
+        b.pending[user_id] -= 1
+        if b.pending[user_id] <= 0:
+            del b.pending[user_id]
+
+    def metrics(self):
+        """
+        Снимок по бэкендам. Очередь и счётчики — этого процесса (pid),
+        host_active — занятые слоты всего хоста.
+        """
+        with self._lock:
+            backends = list(self._backends.values())
+        out = {}
+        for b in backends:
+            with b.cond:
+                depth = defaultdict(int)
+                for priority, _, _ in b.queue:
+                    depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+                out[b.name] = {
+                    "pid": os.getpid(),
+                    "limit": b.limit,
+                    "active": b.active,
+                    "queue_depth": len(b.queue),
+                    "queue_depth_by_priority": dict(depth),
+                    "max_queue": b.max_queue,
+                    "admitted": b.admitted,
+                    "rejected": b.rejected,
+                    "timed_out": b.timed_out,
+                    "wait_avg_s": round(b.wait_total / b.admitted, 3) if b.admitted else 0.0,
+                    "wait_max_s": round(b.wait_max, 3),
+                }
+            out[b.name]["host_active"] = self.host_slots.busy(b.name, b.limit)
+        return out
+
+
+SCHEDULER = LLMScheduler()
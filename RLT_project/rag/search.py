@@ -1,56 +1,52 @@
-import json
-import re
-from pathlib import Path
+import heapq
 from rank_bm25 import BM25Okapi
 
-CHUNKS_PATH = Path(__file__).resolve().parent / "data" / "chunks.jsonl"
+from .analyzer import RussianAnalyzer
+from .chunk_store import get_store, reload_store
 
-def tokenize(text):
-    """Простая токенизация: нижний регистр, без пунктуации"""
-    text = text.lower()
-    text = re.sub(r"[^\w\s]", "", text)
-    return text.split()
-
-def load_chunks(path=CHUNKS_PATH):
-    """Загружает чанки и токенизирует их"""
-    chunks = []
-    tokenized = []
+# Анализатор подключаемый: любой объект с analyze(text) и analyze_many(texts, normalized=False)
+ANALYZER = RussianAnalyzer()
 
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            obj = json.loads(line)
-            chunks.append(obj)
-            tokenized.append(tokenize(obj["text"]))
+def tokenize(text):
+    """Термы запроса: канонизация законов, стоп-слова, стемминг"""
+    return ANALYZER.analyze(text)
 
-    return chunks, tokenized
+def load_index(store, analyzer=None):
+    """Строит BM25 по текстам хранилища; списки токенов не сохраняются"""
+    analyzer = analyzer or ANALYZER
+    # тексты хранилища уже нормализованы при сборке (chunk_store)
+    return BM25Okapi(analyzer.analyze_many(store.iter_texts(), normalized=True))
 
-# При загрузке: читаем данные и строим индекс
-CHUNKS, TOKENS = load_chunks()
-BM25 = BM25Okapi(TOKENS)
+# При загрузке: открываем хранилище чанков и строим индекс
+STORE = get_store()
+BM25 = load_index(STORE)
 
 def search(query, top_k=3):
     """Ищет наиболее релевантные чанки по запросу"""
     query_tokens = tokenize(query)
     scores = BM25.get_scores(query_tokens)
 
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+    top_indices = heapq.nlargest(top_k, range(len(scores)), key=scores.__getitem__)
     results = []
 
+    # тексты материализуются только для итогового top-k
     for i in top_indices:
-        ch = CHUNKS[i]
         results.append({
             "score": round(scores[i], 4),
-            "title": ch.get("title", ""),
-            "url": ch.get("url", ""),
-            "text": ch["text"][:500] + "..." if len(ch["text"]) > 500 else ch["text"]
+            "title": STORE.title(i),
+            "url": STORE.url(i),
+            "text": STORE.snippet(i),
         })
 
     return results
 
-def build_index(force=False):
-    """Перестроить индекс (опционально)"""
-    global CHUNKS, TOKENS, BM25
+def build_index(force=False, analyzer=None):
+    """Перестроить индекс (опционально, в т.ч. с другим анализатором)"""
+    global STORE, BM25, ANALYZER
+    if analyzer is not None:
+        ANALYZER = analyzer
+        force = True
     if force:
-        CHUNKS, TOKENS = load_chunks()
-        BM25 = BM25Okapi(TOKENS)
-    return f"[RAG] index: docs={len(CHUNKS)}, avgdl={BM25.avgdl:.1f}, terms={len(BM25.doc_freqs)}"
\ No newline at end of file
+        STORE = reload_store()
+        BM25 = load_index(STORE)
+    return f"[RAG] index: docs={len(STORE)}, avgdl={BM25.avgdl:.1f}, terms={len(BM25.doc_freqs)}"
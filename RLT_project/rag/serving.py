@@ -0,0 +1,94 @@
+"""
+Многопроцессный режим обслуживания: общие веса моделей и разделение потоков torch.
+
+gunicorn (см. gunicorn.conf.py): модели загружаются один раз в мастере
+(preload), воркеры получают их копированием при записи после fork.
+uvicorn --workers запускает процессы заново, fork не помогает — для него
+веса эмбеддера отображаются в память из файла (RAG_EMBED_WEIGHTS_MMAP),
+и страницы весов делят все процессы через page cache.
+"""
+import gc
+import logging
+import os
+
+from .conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers=None, cores=None):
+    """Потоки intra-op на воркер: ядра делятся поровну, без переподписки"""
+    explicit = get_setting("RAG_TORCH_THREADS", None)
+    if explicit:
+        return int(explicit)
+    workers = workers or int(os.environ.get("WEB_CONCURRENCY", 1))
+    cores = cores or available_cores()
+    return max(1, cores // max(1, workers))
+
+
+def configure_torch_threads(workers=None):
+    """Вызывается в каждом воркере до первого инференса"""
+    import torch
+
+    threads = threads_per_worker(workers)
+    # дочерние пулы OpenMP/MKL, которые поднимутся позже, тоже не должны брать все ядра
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    torch.set_num_threads(threads)
+    try:
+        # inter-op пул можно задать только до первой параллельной работы
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    return threads
+
+
+def preload_models():
+    """
+    Загрузка моделей в мастере перед fork. gc.freeze() убирает загруженные
+    объекты из обхода сборщика мусора — иначе он трогает их заголовки в каждом
+    воркере и страницы копируются.
+    """
+    from . import embed_query
+    from .rerank import RERANKER, rerank_enabled
+
+    embed_query.load_model()
+    if rerank_enabled():
+        RERANKER.load()
+    gc.collect()
+    gc.freeze()
+
+
+def process_report(pid=None):
+    """Память и потоки процесса: rss, уникальная (uss) и пропорциональная (pss) память"""
+    import psutil
+
+    proc = psutil.Process(pid)
+    mem = proc.memory_full_info()
+    return {
+        "pid": proc.pid,
+        "rss_mb": round(mem.rss / 2**20, 1),
+        "uss_mb": round(mem.uss / 2**20, 1),
+        "pss_mb": round(getattr(mem, "pss", 0) / 2**20, 1),
+        "shared_mb": round(getattr(mem, "shared", 0) / 2**20, 1),
+        "os_threads": proc.num_threads(),
+    }
+
+
+def log_worker_report():
+    import torch
+
+    report = process_report()
+    logger.info(
+        "worker %s: rss=%sMB uss=%sMB pss=%sMB shared=%sMB os_threads=%s torch_threads=%s interop=%s cores=%s",
+        report["pid"], report["rss_mb"], report["uss_mb"], report["pss_mb"], report["shared_mb"],
+        report["os_threads"], torch.get_num_threads(), torch.get_num_interop_threads(), available_cores(),
+    )
+    return report
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from chat.models import Chat, Message, User
+
+from . import jobs, llm
+from .analyzer import RussianAnalyzer, SimpleAnalyzer
+from .chunk_store import ChunkStore, SNIPPET_LEN, _store_paths
+from .llm import LLMError
+from .models import AskJob
+from .scheduler import LLMScheduler, LLMOverloaded, PRIORITY_ANSWER, PRIORITY_NORMALIZE
+
+
+class AskJobQueueTests(TestCase):
+    """Очередь AskJob: захват, visibility timeout, ретраи и dead-letter"""
+
+    def setUp(self):
+        self.user = User.objects.create(role="customer")
+        self.chat = Chat.objects.create(user=self.user)
+        self.question = Message.objects.create(chat=self.chat, author=self.user, text="Как пройти аккредитацию?")
+        self.job = jobs.enqueue(self.chat, self.user, self.question)
+
+    def _expire(self, job):
+        AskJob.objects.filter(id=job.id).update(available_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_hides_running_job(self):
+        job = jobs.claim("w1", visibility_timeout=60)
+        self.assertEqual(job.id, self.job.id)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ("running", 1, "w1"))
+        self.assertIsNone(jobs.claim("w2", visibility_timeout=60))
+
+    def test_expired_lease_is_reclaimed(self):
+        first = jobs.claim("w1", visibility_timeout=60)
+        self._expire(first)
+
+        second = jobs.claim("w2", visibility_timeout=60)
+        self.assertEqual(second.id, first.id)
+        self.assertEqual((second.attempts, second.locked_by), (2, "w2"))
+        # первый воркер аренду потерял: его результат не записывается
+        self.assertEqual(jobs.process(first, lambda *a, **kw: "Ответ"), "lost")
+        self.assertEqual(jobs.process(second, lambda *a, **kw: "Ответ"), "done")
+
+    def test_expired_lease_without_attempts_left_is_dead(self):
+        AskJob.objects.filter(id=self.job.id).update(max_attempts=1)
+        job = jobs.claim("w1", visibility_timeout=60)
+        self._expire(job)
+
+        self.assertIsNone(jobs.claim("w2", visibility_timeout=60))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "dead")
+        self.assertEqual(self.job.last_error, "visibility timeout exceeded")
+
+    def test_success_saves_bot_answer(self):
+        job = jobs.claim("w1")
+        status = jobs.process(job, lambda *a, **kw: "Подайте заявку в ЛК.\n\nИсточник: https://example.org/a")
+
+        self.assertEqual(status, "done")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done")
+        self.assertEqual(self.job.answer.text, "Подайте заявку в ЛК.")
+        self.assertEqual(self.job.citations, ["https://example.org/a"])
+
+    def test_llm_error_is_retried_with_backoff(self):
+        def pipeline(*args, **kwargs):
+            raise LLMError("ollama: connection refused")
+
+        job = jobs.claim("w1")
+        self.assertEqual(jobs.process(job, pipeline), "queued")
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "queued")
+        self.assertEqual(self.job.locked_by, "")
+        self.assertEqual(self.job.last_error, "ollama: connection refused")
+        self.assertGreater(self.job.available_at, timezone.now())
+        self.assertIsNone(self.job.answer)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 1)
+        # до конца задержки задача недоступна
+        self.assertIsNone(jobs.claim("w2"))
+
+    def test_backoff_doubles_per_attempt(self):
+        def pipeline(*args, **kwargs):
+            raise LLMOverloaded("ollama: очередь заполнена (32)")
+
+        delays = []
+        for _ in range(2):
+            job = jobs.claim("w1")
+            before = timezone.now()
+            jobs.process(job, pipeline)
+            job.refresh_from_db()
+            delays.append((job.available_at - before).total_seconds())
+            self._expire(job)
+
+        self.assertAlmostEqual(delays[1] / delays[0], 2, delta=0.1)
+
+    def test_dead_letter_after_max_attempts(self):
+        def pipeline(*args, **kwargs):
+            raise LLMError("ollama: 500 Internal Server Error")
+
+        statuses = []
+        for _ in range(self.job.max_attempts):
+            job = jobs.claim("w1")
+            statuses.append(jobs.process(job, pipeline))
+            self._expire(job)
+
+        self.assertEqual(statuses[-1], "dead")
+        self.assertEqual(statuses[:-1], ["queued"] * (self.job.max_attempts - 1))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "dead")
+        self.assertIsNone(jobs.claim("w1"))
+
+
+class ChunkStoreTests(SimpleTestCase):
+    """Хранилище чанков: сохранение и mmap, согласованность файлов, сниппеты"""
+
+    RECORDS = [
+        {"title": "Регистрация", "url": "https://example.org/a", "text": "Регистрация в ЕИС.\n\nШаг 1: «вход» — ЛК"},
+        {"title": "Регистрация", "url": "https://example.org/a", "text": "Шаг 2: подтверждение ёмкой почты"},
+        {"title": "ЭДО", "url": "https://example.org/b", "text": ""},
+        {"title": "ЭДО", "url": "https://example.org/b", "text": "Подписание УПД 🔑 в системе ЭДО"},
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "chunks.jsonl"
+
+    def test_save_open_round_trip(self):
+        built = ChunkStore.from_records(self.RECORDS)
+        built.save(self.path)
+        opened = ChunkStore.open(self.path)
+
+        self.assertEqual(len(opened), len(self.RECORDS))
+        self.assertEqual([opened.get(i) for i in range(len(opened))], [built.get(i) for i in range(len(built))])
+        self.assertEqual(opened.titles, ["Регистрация", "ЭДО"])
+        self.assertEqual(opened.urls, ["https://example.org/a", "https://example.org/b"])
+        self.assertEqual(opened.text(0), "Регистрация в ЕИС.\n\nШаг 1: \"вход\" - ЛК")
+        self.assertEqual(opened.build_id, built.build_id)
+
+    def test_open_rejects_files_from_different_builds(self):
+        ChunkStore.from_records(self.RECORDS).save(self.path)
+        bin_path, idx_path, _ = _store_paths(self.path)
+        old_idx = idx_path.read_bytes()
+        ChunkStore.from_records(self.RECORDS[:1] + [{"title": "X", "url": "u", "text": "длинный текст " * 10}]).save(self.path)
+        idx_path.write_bytes(old_idx[:len(idx_path.read_bytes())])
+
+        with self.assertRaises(ValueError):
+            ChunkStore.open(self.path)
+
+    def test_snippet_on_multibyte_text(self):
+        store = ChunkStore.from_records([
+            {"title": "", "url": "", "text": "я" * SNIPPET_LEN},
+            {"title": "", "url": "", "text": "я" * (SNIPPET_LEN + 1)},
+            {"title": "", "url": "", "text": "🔑" * (SNIPPET_LEN + 100)},
+        ])
+        store.save(self.path)
+        store = ChunkStore.open(self.path)
+
+        self.assertEqual(store.snippet(0), "я" * SNIPPET_LEN)
+        self.assertEqual(store.snippet(1), "я" * SNIPPET_LEN + "...")
+        self.assertEqual(store.snippet(2), "🔑" * SNIPPET_LEN + "...")
+
+    def test_hits_from_another_build_are_skipped(self):
+        from . import main_rag
+
+        store = ChunkStore.from_records(self.RECORDS)
+        hits = [
+            SimpleNamespace(payload={"chunk_id": 1, "build": store.build_id, "url": "https://example.org/a"}),
+            SimpleNamespace(payload={"chunk_id": 3, "build": "0" * 16, "url": "https://example.org/b"}),
+            SimpleNamespace(payload={"chunk_id": 0, "url": "https://example.org/b"}),
+        ]
+        with mock.patch.object(main_rag, "get_store", return_value=store):
+            self.assertEqual(main_rag.resolve_hit(hits[0])[1], "https://example.org/a")
+            self.assertIsNone(main_rag.resolve_hit(hits[2]))
+            with self.assertLogs("rag.main_rag", level="ERROR"):
+                self.assertEqual(main_rag.fresh_hits(hits), hits[:1])
+
+
+class AnalyzerTests(SimpleTestCase):
+    """Подключаемые анализаторы BM25 и общая нормализация"""
+
+    def test_law_references_are_canonical(self):
+        analyzer = RussianAnalyzer()
+        self.assertEqual(analyzer.analyze("44 фз")[0], analyzer.analyze("44-ФЗ")[0])
+        self.assertEqual(analyzer.analyze("Закон 223фз")[-1], "223-фз")
+
+    def test_unrelated_words_keep_separate_terms(self):
+        analyzer = RussianAnalyzer()
+        for a, b in [("ставка", "доставка"), ("ключ", "заключить"), ("правка", "отправка"),
+                     ("говор", "договор"), ("написать", "подписать")]:
+            self.assertNotEqual(analyzer.analyze(a), analyzer.analyze(b), (a, b))
+
+    def test_listed_families_fold_prefixes(self):
+        analyzer = RussianAnalyzer()
+        self.assertEqual(
+            set(analyzer.analyze("регистрация зарегистрироваться перерегистрация")), {"регистр"},
+        )
+        self.assertEqual(analyzer.analyze("перезаключить"), analyzer.analyze("заключить"))
+        # результат индексации и запроса совпадает независимо от корпуса
+        self.assertEqual(analyzer.analyze_many(["доставка заключить"]), [analyzer.analyze("доставка заключить")])
+
+    def test_index_builds_with_any_analyzer(self):
+        from .search import load_index
+
+        store = ChunkStore.from_records([
+            {"title": "Регистрация", "url": "https://example.org/a", "text": "Регистрация в ЕИС по 44 фз"},
+            {"title": "ЭДО", "url": "https://example.org/b", "text": "Подписание УПД в системе ЭДО"},
+            {"title": "Тарифы", "url": "https://example.org/c", "text": "Стоимость тарифа для участника закупок"},
+        ])
+        for analyzer in (RussianAnalyzer(), SimpleAnalyzer()):
+            bm25 = load_index(store, analyzer)
+            scores = bm25.get_scores(analyzer.analyze("регистрация"))
+            self.assertGreater(scores[0], scores[1], type(analyzer).__name__)
+
+
+class CrossEncoderRerankerTests(SimpleTestCase):
+    """Реранжирование: порог, кэш оценок, бюджет времени (модель заменена таблицей оценок)"""
+
+    SCORES = {"оплата": 0.9, "регистрация": 0.1, "аккредитация": 0.5, "подпись": 0.7}
+
+    def setUp(self):
+        from .rerank import CrossEncoderReranker
+
+        self.reranker = CrossEncoderReranker(model_path="unused", batch_size=2, cache_size=100)
+        patcher = mock.patch.object(self.reranker, "_score_batch", side_effect=self._score)
+        self.score_batch = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.delay = 0.0
+
+    def _score(self, query, texts):
+        time.sleep(self.delay)
+        return [self.SCORES[t] for t in texts]
+
+    def _rank(self, texts, **kwargs):
+        kwargs.setdefault("threshold", 0.3)
+        kwargs.setdefault("budget", 10.0)
+        return self.reranker.rank("вопрос", texts, texts, **kwargs)
+
+    def test_threshold_filters_and_orders_by_score(self):
+        texts = ["регистрация", "аккредитация", "оплата", "подпись"]
+        self.assertEqual(self._rank(texts, top_k=3), [2, 3, 1])
+        self.assertEqual(self._rank(texts, top_k=10, threshold=0.8), [2])
+
+    def test_nothing_relevant_gives_empty_result(self):
+        self.assertEqual(self._rank(["регистрация", "аккредитация"], threshold=0.95), [])
+
+    def test_cached_scores_are_reused(self):
+        texts = ["регистрация", "аккредитация", "оплата"]
+        first = self._rank(texts)
+        calls = self.score_batch.call_count
+        self.assertEqual(calls, 2)   # батчи по 2
+
+        self.assertEqual(self._rank(texts), first)
+        self.assertEqual(self.score_batch.call_count, calls)
+        self.reranker.clear_cache()
+        self._rank(texts)
+        self.assertEqual(self.score_batch.call_count, 2 * calls)
+
+    def test_exhausted_budget_appends_unscored_in_original_order(self):
+        self._rank(["подпись"])   # в кэше
+        # оценён только первый батч, дальше бюджет исчерпан
+        self.delay = 0.05
+        order = self._rank(["регистрация", "аккредитация", "оплата", "подпись"], top_k=10, budget=0.01)
+        # оценённые и прошедшие порог (по убыванию), затем неоценённые в порядке bi-encoder'а
+        self.assertEqual(order, [3, 1, 2])
+        self.assertEqual(self.score_batch.call_count, 2)
+
+    def test_pipeline_falls_back_when_model_fails(self):
+        from . import main_rag
+
+        hits = [SimpleNamespace(id=i, payload={"title": t, "url": f"u{i}", "text": t})
+                for i, t in enumerate(["регистрация", "оплата", "подпись", "аккредитация"])]
+        with mock.patch.object(main_rag.RERANKER, "rank", side_effect=OSError("model not found")):
+            with self.assertLogs("rag.main_rag", level="ERROR"):
+                self.assertEqual(main_rag.rerank_hits("search_query: вопрос", hits, top_k=3), hits[:3])
+
+
+class LLMCallTests(SimpleTestCase):
+    """Сбой сервера LLM — исключение, а не текст ответа"""
+
+    def test_connection_error_raises(self):
+        refused = httpx.ConnectError("connection refused")
+        with mock.patch.object(llm, "post_generate", side_effect=refused):
+            with self.assertRaises(LLMError):
+                llm.call_llm("вопрос", profile="answer")
+
+    def test_length_truncated_answer_is_dropped(self):
+        data = {"response": "Для регистрации откройте", "thinking": "...", "done_reason": "length"}
+        with mock.patch.object(llm, "post_generate", return_value=data):
+            with self.assertLogs("rag.llm", level="WARNING"):
+                self.assertEqual(llm.call_llm("вопрос", profile="answer"), "")
+
+    def test_empty_normalize_answer_is_logged(self):
+        data = {"response": "", "thinking": "...", "done_reason": "stop"}
+        with mock.patch.object(llm, "post_generate", return_value=data):
+            with self.assertLogs("rag.llm", level="WARNING") as logs:
+                self.assertEqual(llm.call_llm("вопрос", profile="normalize"), "")
+        self.assertIn("пустой ответ", logs.output[-1])
+
+
+class LLMSchedulerTests(SimpleTestCase):
+    """Планировщик LLM: приоритеты, чередование пользователей, дедлайны"""
+
+    def setUp(self):
+        slot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(slot_dir.cleanup)
+        self.slot_dir = slot_dir.name
+        self.scheduler = LLMScheduler(
+            concurrency={"llm": 1}, max_queue=8, queue_timeout={"answer": 5.0, "normalize": 5.0},
+            slot_dir=self.slot_dir,
+        )
+        self.release = threading.Event()
+        self.order = []
+        self.threads = []
+        # держим единственный слот, пока не выстроится очередь
+        self._start(self._hold)
+        self._wait_for(lambda m: m["admitted"] == 1)
+
+    def tearDown(self):
+        self.release.set()
+        for t in self.threads:
+            t.join(timeout=5)
+
+    def _hold(self):
+        with self.scheduler.slot("llm", PRIORITY_ANSWER):
+            self.release.wait(5)
+
+    def _start(self, target, *args):
+        t = threading.Thread(target=target, args=args, daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def _enqueue(self, label, priority, user_id=None):
+        def run():
+            with self.scheduler.slot("llm", priority, user_id):
+                self.order.append(label)
+
+        depth = self._metrics().get("queue_depth", 0)
+        self._start(run)
+        self._wait_for(lambda m: m["queue_depth"] == depth + 1)
+
+    def _metrics(self):
+        return self.scheduler.metrics().get("llm", {})
+
+    def _wait_for(self, predicate, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            metrics = self._metrics()
+            if metrics and predicate(metrics):
+                return
+            time.sleep(0.005)
+        self.fail(f"планировщик не пришёл в ожидаемое состояние: {self._metrics()}")
+
+    def _drain(self):
+        self.release.set()
+        for t in self.threads:
+            t.join(timeout=5)
+
+    def test_answer_goes_before_normalize(self):
+        self._enqueue("normalize-1", PRIORITY_NORMALIZE)
+        self._enqueue("normalize-2", PRIORITY_NORMALIZE)
+        self._enqueue("answer", PRIORITY_ANSWER)
+        self._drain()
+        self.assertEqual(self.order, ["answer", "normalize-1", "normalize-2"])
+
+    def test_users_alternate_within_priority(self):
+        self._enqueue("a1", PRIORITY_ANSWER, "alice")
+        self._enqueue("a2", PRIORITY_ANSWER, "alice")
+        self._enqueue("a3", PRIORITY_ANSWER, "alice")
+        self._enqueue("b1", PRIORITY_ANSWER, "bob")
+        self._drain()
+        self.assertEqual(self.order, ["a1", "b1", "a2", "a3"])
+
+    def test_deadline_raises_and_leaves_queue(self):
+        started = time.monotonic()
+        with self.assertRaises(LLMOverloaded):
+            with self.scheduler.slot("llm", PRIORITY_ANSWER, "alice", timeout=0.05):
+                pass
+        self.assertLess(time.monotonic() - started, 1.0)
+
+        metrics = self._metrics()
+        self.assertEqual((metrics["timed_out"], metrics["queue_depth"]), (1, 0))
+        # ушедший по дедлайну не занимает очередь и не влияет на ранг пользователя
+        self._enqueue("a1", PRIORITY_ANSWER, "alice")
+        self._enqueue("b1", PRIORITY_ANSWER, "bob")
+        self._drain()
+        self.assertEqual(self.order, ["a1", "b1"])
+
+    def test_full_queue_rejects_immediately(self):
+        scheduler = LLMScheduler(concurrency={"llm": 1}, max_queue=1, queue_timeout={"answer": 5.0}, slot_dir="")
+        self.scheduler = scheduler
+        release = threading.Event()
+
+        def hold():
+            with scheduler.slot("llm", PRIORITY_ANSWER):
+                release.wait(5)
+
+        for _ in range(2):   # первый занимает слот, второй — единственное место в очереди
+            t = threading.Thread(target=hold, daemon=True)
+            t.start()
+            self.threads.append(t)
+        self._wait_for(lambda m: m["active"] == 1 and m["queue_depth"] == 1)
+
+        with self.assertRaises(LLMOverloaded):
+            with scheduler.slot("llm", PRIORITY_ANSWER):
+                pass
+        self.assertEqual(self._metrics()["rejected"], 1)
+        release.set()
+
+    def test_limit_is_shared_between_processes(self):
+        # второй планировщик с тем же каталогом слотов — как другой воркер gunicorn
+        other = LLMScheduler(concurrency={"llm": 1}, queue_timeout={"answer": 5.0}, slot_dir=self.slot_dir)
+        self.assertEqual(self._metrics()["host_active"], 1)
+        with self.assertRaises(LLMOverloaded):
+            with other.slot("llm", PRIORITY_ANSWER, timeout=0.1):
+                pass
+        self.assertEqual(other.metrics()["llm"]["timed_out"], 1)
+
+        self._drain()
+        with other.slot("llm", PRIORITY_ANSWER, timeout=1.0):
+            self.assertEqual(other.metrics()["llm"]["host_active"], 1)
@@ -0,0 +1,104 @@
+"""
+Каноническая форма текста — общая для запросов и документов.
+
+Все посимвольные замены (пробелы, тире, кавычки, ё) — одна таблица,
+остальное — заранее скомпилированные выражения. Запрос (normalize_query),
+BM25 (analyzer) и эмбеддинги видят одинаково нормализованный текст;
+чанки приводятся к этой форме один раз при сборке хранилища.
+"""
+import re
+import unicodedata
+
+FZ_SET = {"44", "223", "63", "135", "149"}
+
+# Версия правил: при изменении хранилище чанков считается устаревшим (make_chunks --store-only)
+NORMALIZER_VERSION = 1
+
+_CHAR_MAP = {
+    "\u2026": "...",                                               # многоточие
+    "\u00A0": " ", "\u2009": " ", "\u2007": " ", "\u202F": " ",  # неразрывные и узкие пробелы
+    "\u2013": "-", "\u2014": "-", "\u2212": "-",                  # тире и минус
+    "\u00AB": "\"", "\u00BB": "\"", "\u201C": "\"", "\u201D": "\"", "\u201E": "\"",
+    "ё": "е", "Ё": "Е",
+}
+
+
+class TextNormalizer:
+    """
+    normalize(text) — одна строка, normalize_many(texts) — пакет.
+    collapse_newlines=False сохраняет абзацы (для чанков: текст уходит и в контекст LLM).
+    Каждый шаг сначала дёшево проверяет, есть ли ему что менять: типичный запрос
+    проходит почти без работы регулярных выражений.
+    """
+
+    def __init__(self, fz_numbers=FZ_SET, collapse_newlines=True):
+        self._table = dict(_CHAR_MAP)
+        # str.translate на кириллице идёт через dict на каждый символ (~100 нс/символ);
+        # выражение-класс символов трогает только совпадения
+        self._chars_re = re.compile("[%s]" % "".join(re.escape(c) for c in self._table))
+        self._punct_re = re.compile(r"!{2,}|\?{2,}|\.{4,}")
+        self._collapse = self._collapse_spaces if collapse_newlines else self._collapse_lines
+        # 223 фз / 223-фз / 223фз -> 223-ФЗ
+        self._fz_re = re.compile(
+            r"\b(?P<num>(?:%s))\s*[-–—]?\s*фз\b" % "|".join(sorted(fz_numbers, key=len, reverse=True)),
+            re.IGNORECASE,
+        )
+
+    def _char(self, m):
+        return self._table[m.group(0)]
+
+    @staticmethod
+    def _squash(m):
+        s = m.group(0)
+        return "..." if s[0] == "." else s[0]
+
+    @staticmethod
+    def _fz(m):
+        return f"{m.group('num')}-ФЗ"
+
+    @staticmethod
+    def _collapse_spaces(text):
+        return " ".join(text.split())
+
+    @staticmethod
+    def _collapse_lines(text):
+        # пробелы внутри строк схлопываются, серия пустых строк -> один разрыв абзаца
+        out, blank = [], False
+        for line in text.split("\n"):
+            line = " ".join(line.split())
+            if not line:
+                blank = True
+                continue
+            if blank and out:
+                out.append("")
+            out.append(line)
+            blank = False
+        return "\n".join(out)
+
+    def canonicalize_fz(self, text):
+        return self._fz_re.sub(self._fz, text)
+
+    def normalize(self, text):
+        ascii_only = text.isascii()
+        if not ascii_only:
+            if not unicodedata.is_normalized("NFKC", text):
+                text = unicodedata.normalize("NFKC", text)
+            text = self._chars_re.sub(self._char, text)
+        if "!!" in text or "??" in text or "...." in text:
+            text = self._punct_re.sub(self._squash, text)
+        text = self._collapse(text)
+        if not ascii_only and ("фз" in text or "ФЗ" in text or "Фз" in text or "фЗ" in text):
+            text = self._fz_re.sub(self._fz, text)
+        return text
+
+    __call__ = normalize
+
+    def normalize_many(self, texts):
+        normalize = self.normalize
+        return [normalize(t) for t in texts]
+
+
+# Запросы: одна строка
+NORMALIZER = TextNormalizer()
+# Чанки: та же форма, но с сохранением абзацев
+DOCUMENT_NORMALIZER = TextNormalizer(collapse_newlines=False)
@@ -0,0 +1,232 @@
+"""
+Офлайн-подбор параметров поиска: размер чанка, перекрытие, top_k, глубина кандидатов.
+
+Для каждой конфигурации: recall@k и MRR по размеченным вопросам,
+оценка токенов промпта ответа и задержки (поиск + реранжирование + prefill).
+Поиск:
+  dense — как /api/ask/: эмбеддинги RoSBERTa (get_embedding), косинус по матрице
+          в памяти вместо Qdrant; вопрос — без LLM-переформулировки;
+  bm25  — тот же анализатор, что в rag.search; индексы под разные параметры
+          чанкования строятся параллельно в отдельных процессах.
+"""
+import json
+import time
+from pathlib import Path
+
+from rank_bm25 import BM25Okapi
+
+from .analyzer import RussianAnalyzer
+from .answering import parse_answer
+from .chunk_store import CHUNKS_PATH
+from .chunking import IN_FILE, split_articles
+from .textnorm import DOCUMENT_NORMALIZER
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+LABELS_PATH = DATA_DIR / "retrieval_eval.jsonl"
+
+CHARS_PER_TOKEN = 3.0     # русский текст в токенизаторе gpt-oss (o200k), грубо
+PREFILL_TPS = 400.0       # токенов промпта в секунду на prefill у локальной модели
+
+
+# === Размеченный набор: вопрос -> ожидаемые статьи ===
+def load_labels(path=LABELS_PATH):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_labels(labels, path=LABELS_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        for item in labels:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def seed_from_feedback(labels, feedback_path):
+    """Добавляет вопросы с оценкой like: ожидаемая статья — "Источник:" из понравившегося ответа"""
+    known = {item["question"] for item in labels}
+    added = 0
+    with open(feedback_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            fb = json.loads(line)
+            question = (fb.get("question") or "").strip()
+            if fb.get("type") != "like" or not question or question in known:
+                continue
+            _, sources = parse_answer(fb.get("answer") or "")
+            urls = [u for u in sources if u.startswith("http")]
+            if not urls:
+                continue
+            labels.append({"question": question, "urls": urls, "source": "feedback"})
+            known.add(question)
+            added += 1
+    return added
+
+
+# === Исходные статьи для перечанкования ===
+def _merge_overlap(text, chunk, max_overlap):
+    """Склеивает соседние чанки, убирая общий хвост/голову"""
+    for k in range(min(len(text), len(chunk), max_overlap), 0, -1):
+        if text.endswith(chunk[:k]):
+            return text + chunk[k:]
+    return text + "\n\n" + chunk
+
+
+def articles_from_chunks(path=CHUNKS_PATH, max_overlap=400):
+    """Восстанавливает статьи из chunks.jsonl, если parsed_data.json недоступен"""
+    articles = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            ch = json.loads(line)
+            article = articles.setdefault(ch["url"], {"title": ch["title"], "url": ch["url"], "text": ""})
+            article["text"] = _merge_overlap(article["text"], ch["text"], max_overlap) if article["text"] else ch["text"]
+    return list(articles.values())
+
+
+def load_articles():
+    if Path(IN_FILE).exists():
+        with open(IN_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return articles_from_chunks()
+
+
+# === Индекс под одну конфигурацию чанкования ===
+def _bm25_scorer(chunks):
+    analyzer = RussianAnalyzer()
+    bm25 = BM25Okapi(analyzer.analyze_many((ch["text"] for ch in chunks), normalized=True))
+    return lambda question: bm25.get_scores(analyzer.analyze(question))
+
+
+def _dense_scorer(chunks):
+    # чанки — как в index_chunks, вопрос — как в search_in_qdrant; векторы нормированы,
+    # поэтому косинус Qdrant — скалярное произведение
+    import numpy as np
+    from .embed_query import get_embedding
+
+    matrix = np.vstack([get_embedding(ch["text"], remove_prefix=False) for ch in chunks])
+    return lambda question: matrix @ get_embedding(question)
+
+
+RETRIEVERS = {"dense": _dense_scorer, "bm25": _bm25_scorer}
+
+
+def retrieve_for_chunking(articles, chunk_size, chunk_overlap, questions, depth, retriever="dense"):
+    """Индексирует чанки заданного размера и возвращает top-depth кандидатов на каждый вопрос"""
+    started = time.monotonic()
+    chunks = split_articles(articles, chunk_size, chunk_overlap)
+    # как в хранилище: чанки индексируются в канонической форме
+    for ch, text in zip(chunks, DOCUMENT_NORMALIZER.normalize_many(ch["text"] for ch in chunks)):
+        ch["text"] = text
+    score = RETRIEVERS[retriever](chunks)
+    build_s = time.monotonic() - started
+
+    hits, search_s = [], []
+    for question in questions:
+        t0 = time.monotonic()
+        scores = score(question)
+        top = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:depth]
+        search_s.append(time.monotonic() - t0)
+        hits.append([(i, chunks[i]["title"], chunks[i]["url"], chunks[i]["text"]) for i in top])
+
+    return {
+        "retriever": retriever,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunks": len(chunks),
+        "build_s": build_s,
+        "hits": hits,
+        "search_s": search_s,
+    }
+
+
+# === Метрики ===
+def recall_at_k(urls, expected):
+    return len(expected & set(urls)) / len(expected) if expected else 0.0
+
+
+def reciprocal_rank(urls, expected):
+    for rank, url in enumerate(urls, 1):
+        if url in expected:
+            return 1.0 / rank
+    return 0.0
+
+
+def estimate_tokens(chars, chars_per_token=CHARS_PER_TOKEN):
+    return chars / chars_per_token
+
+
+def pareto_front(rows):
+    """
+    Недоминируемые конфигурации: нет другой, которая не хуже по recall, MRR,
+    токенам и задержке и строго лучше хотя бы по одному.
+    """
+    def key(r):
+        return (r["recall"], r["mrr"], -r["tokens"], -r["latency_s"])
+
+    front = []
+    for r in rows:
+        kr = key(r)
+        dominated = any(
+            all(a >= b for a, b in zip(key(o), kr)) and key(o) != kr
+            for o in rows if o is not r
+        )
+        if not dominated:
+            front.append(r)
+    return front
+
+
+def evaluate(result, labels, template, top_ks, candidates, reranker=None,
+             prefill_tps=PREFILL_TPS, chars_per_token=CHARS_PER_TOKEN):
+    """
+    Строки таблицы для одной конфигурации чанкования и глубины кандидатов, по одной на top_k.
+    Реранжирование (если есть) выполняется один раз с максимальным top_k:
+    его результат упорядочен по оценке, меньшие top_k — префиксы. Бюджет времени
+    реранжирования офлайн не ограничен: оцениваются все кандидаты.
+    """
+    max_k = max(top_ks)
+    per_k = {k: {"recall": [], "rr": [], "tokens": [], "latency_s": []} for k in top_ks}
+
+    for item, hits, search_s in zip(labels, result["hits"], result["search_s"]):
+        expected = set(item["urls"])
+        pool = hits[:candidates]
+        rerank_s = 0.0
+        if reranker is not None:
+            reranker.clear_cache()   # задержку меряем без кэша оценок
+            t0 = time.monotonic()
+            keys = [f"{result['chunk_size']}/{result['chunk_overlap']}/{h[0]}" for h in pool]
+            order = reranker.rank(item["question"], keys, [h[3] for h in pool], top_k=max_k, budget=float("inf"))
+            rerank_s = time.monotonic() - t0
+            ranked = [pool[i] for i in order]
+        else:
+            ranked = pool[:max_k]
+
+        for k in top_ks:
+            chosen = ranked[:k]
+            urls = [h[2] for h in chosen]
+            if chosen:
+                context = "\n\n".join(f"{title} ({url}): {text}" for _, title, url, text in chosen)
+                system, prompt = template.render(context=context, source=urls[0], question=item["question"])
+                tokens = estimate_tokens(len(system) + len(prompt), chars_per_token)
+            else:
+                tokens = 0.0   # пустой результат — сразу оператор, LLM не вызывается
+            acc = per_k[k]
+            acc["recall"].append(recall_at_k(urls, expected))
+            acc["rr"].append(reciprocal_rank(urls, expected))
+            acc["tokens"].append(tokens)
+            acc["latency_s"].append(search_s + rerank_s + tokens / prefill_tps)
+
+    n = max(1, len(labels))
+    return [{
+        "retriever": result["retriever"],
+        "chunk_size": result["chunk_size"],
+        "chunk_overlap": result["chunk_overlap"],
+        "chunks": result["chunks"],
+        "top_k": k,
+        "candidates": candidates if reranker is not None else k,
+        "recall": sum(acc["recall"]) / n,
+        "mrr": sum(acc["rr"]) / n,
+        "tokens": sum(acc["tokens"]) / n,
+        "latency_s": sum(acc["latency_s"]) / n,
+    } for k, acc in per_k.items()]
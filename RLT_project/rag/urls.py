@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import api_ask, feedback_view
+from .views import api_ask, feedback_view, llm_metrics, job_status
 
 urlpatterns = [
     path('ask/', api_ask, name='api_ask'),
-    path('feedback/', feedback_view, name='feedback')
+    path('feedback/', feedback_view, name='feedback'),
+    path('jobs/<uuid:job_id>/', job_status, name='job_status'),
+    path('metrics/llm/', llm_metrics, name='llm_metrics'),
 ]
@@ -3,11 +3,18 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.conf import settings
 import json
 
 from chat.models import User, Message, Chat
 from chat.serializers import MessageSerializer
-from .main_rag import rag_pipeline  # твой RAG пайплайн
+from chat.realtime import publish_chat_event
+from .main_rag import rag_pipeline, OPERATOR_FALLBACK  # твой RAG пайплайн
+from .llm import LLMError
+from .answering import parse_answer, bot_message_serializer
+from .models import AskJob
+from . import jobs
+from .scheduler import SCHEDULER, LLMOverloaded
 
 
 @csrf_exempt
@@ -24,6 +31,7 @@ def api_ask(request):
 
     user_id = data.get("user_id")
     chat_id = data.get("chat_id")
+    run_async = bool(data.get("async", getattr(settings, "RAG_ASK_ASYNC", False)))
 
     try:
         with transaction.atomic():
@@ -49,31 +57,37 @@ def api_ask(request):
                 return JsonResponse({"errors": in_msg_ser.errors}, status=400)
             in_msg = in_msg_ser.save()
 
-            # 4) получаем ответ из RAG пайплайна
-            answer = rag_pipeline(question)
-
-            # 4.1) обрезаем всё до "...done thinking" включительно
-            marker = "...done thinking."
-            if marker in answer:
-                answer = answer.split(marker, 1)[1].strip()
-
-            # 5) разбираем источники
-            sources = []
-            if "Источник:" in answer:
-                parts = answer.split("Источник:")
-                answer_text = parts[0].strip()
-                sources = [parts[1].strip()]
-            else:
-                answer_text = answer
-
-            # 6) создаём сообщение от бота
-            bot, _ = User.objects.get_or_create(role="llm_bot", defaults={"is_active": True})
-            out_msg_ser = MessageSerializer(data={
-                "chat": str(chat.id),
-                "author": str(bot.id),
-                "text": answer_text,
-                "is_read": True,
-            })
+            # 3.1) асинхронный режим: ставим задачу в очередь и сразу отвечаем
+            if run_async:
+                job = jobs.enqueue(chat, user, in_msg)
+                return JsonResponse({
+                    "job": str(job.id),
+                    "status": job.status,
+                    "ids": {
+                        "user": str(user.id),
+                        "chat": str(chat.id),
+                        "question_message": str(in_msg.id),
+                    }
+                }, status=202)
+
+        # 4) получаем ответ из RAG пайплайна вне транзакции: вызов LLM идёт секунды,
+        #    соединение с БД на это время не держит блокировок (токены уходят в WebSocket чата);
+        #    LLM перегружена или недоступна — сразу на оператора
+        try:
+            answer = rag_pipeline(
+                question,
+                user_id=str(user.id),
+                on_token=lambda text: publish_chat_event(chat.id, {"type": "token", "text": text}),
+            )
+        except (LLMOverloaded, LLMError):
+            answer = OPERATOR_FALLBACK
+
+        # 5) отрезаем рассуждения модели и разбираем источники
+        answer_text, sources = parse_answer(answer)
+
+        # 6) создаём сообщение от бота
+        with transaction.atomic():
+            out_msg_ser = bot_message_serializer(chat, answer_text)
             if not out_msg_ser.is_valid():
                 return JsonResponse({"errors": out_msg_ser.errors}, status=400)
             out_msg = out_msg_ser.save()
@@ -92,6 +106,29 @@ def api_ask(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """Опрос асинхронной задачи: статус, а после выполнения — ответ бота"""
+    job = get_object_or_404(AskJob.objects.select_related('answer'), id=job_id)
+    data = {
+        "job": str(job.id),
+        "status": job.status,
+        "attempts": job.attempts,
+        "ids": {
+            "user": str(job.user_id),
+            "chat": str(job.chat_id),
+            "question_message": str(job.question_id),
+        }
+    }
+    if job.status == 'done' and job.answer:
+        data["answer"] = job.answer.text
+        data["citations"] = job.citations
+        data["ids"]["answer_message"] = str(job.answer_id)
+    elif job.status == 'dead':
+        data["error"] = job.last_error
+    return JsonResponse(data)
+
 @csrf_exempt
 def feedback_view(request):
     if request.method != 'POST':
@@ -117,3 +154,9 @@ def feedback_view(request):
         return JsonResponse({'ok': True})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def llm_metrics(request):
+    """Очереди и счётчики планировщика LLM этого процесса и занятые слоты хоста (для мониторинга)"""
+    return JsonResponse(SCHEDULER.metrics())